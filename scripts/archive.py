@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+
+from loguru import logger
+
+from core.config.settings import settings
+from core.objects.database import database
+from modules.archive.partitions import (
+    PARTITIONED_TABLES, create_partitions, archive_orders, expired_partitions, detach_partition, export_partition,
+    cutoff
+)
+
+
+async def main(arguments: argparse.Namespace) -> None:
+    await database.connect()
+
+    async with database.get_connection() as connection:
+        if created := await create_partitions(connection, 'transactions', None, settings.archive.partitions_ahead):
+            logger.info(f'Создано партиций сделок: {created}')
+
+        archived = await archive_orders(connection, cutoff(arguments.orders_retention), settings.archive.batch_size)
+        logger.info(f'Перенесено завершённых ордеров в архив: {archived}')
+
+        for table in PARTITIONED_TABLES:
+            for partition in await expired_partitions(connection, table, cutoff(arguments.retention)):
+                detached = await detach_partition(connection, table, partition)
+
+                if arguments.directory:
+                    path = await export_partition(connection, detached, arguments.directory)
+                    logger.info(f'Партиция {partition} выгружена в {path}')
+                else:
+                    logger.info(f'Партиция {partition} отсоединена как {detached}')
+
+    await database.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Архивация старых сделок и завершённых ордеров')
+    parser.add_argument('--orders-retention', type=int, default=settings.archive.orders_retention)
+    parser.add_argument('--retention', type=int, default=settings.archive.retention)
+    parser.add_argument('--directory', default=settings.archive.directory)
+
+    asyncio.run(main(parser.parse_args()))
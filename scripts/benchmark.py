@@ -0,0 +1,371 @@
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Protocol
+
+import orjson
+from loguru import logger
+
+from create_database import create, seed
+from core.config.settings import settings
+from core.objects.database import database
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+METRIC_PATTERN = re.compile(r'^(http_request_db_queries|http_request_db_duration_seconds)_(sum|count)\{route="([^"]*)"} (\S+)$')
+
+
+class Client(Protocol):
+
+    async def request(
+        self, method: str, path: str, headers: dict[str, str] | None = None, body: bytes = b''
+    ) -> tuple[int, bytes]:
+        ...
+
+
+class AsgiClient:
+
+    def __init__(self, app):
+        self.__app = app
+
+    async def request(
+        self, method: str, path: str, headers: dict[str, str] | None = None, body: bytes = b''
+    ) -> tuple[int, bytes]:
+        path, _, query = path.partition('?')
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (b'content-type', b'application/json'),
+                *((name.lower().encode(), value.encode()) for name, value in (headers or {}).items())
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('127.0.0.1', 80)
+        }
+
+        is_done = asyncio.Event()
+        is_sent = False
+
+        status = 0
+        chunks = []
+
+        async def receive():
+            nonlocal is_sent
+
+            if not is_sent:
+                is_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            await is_done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+                if not message.get('more_body', False):
+                    is_done.set()
+
+        await self.__app(scope, receive, send)
+        is_done.set()
+
+        return status, b''.join(chunks)
+
+
+class HttpClient:
+
+    def __init__(self, host: str, port: int):
+        self.__host = host
+        self.__port = port
+        self.__idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def request(
+        self, method: str, path: str, headers: dict[str, str] | None = None, body: bytes = b''
+    ) -> tuple[int, bytes]:
+        reader, writer = self.__idle.pop() if self.__idle else await asyncio.open_connection(self.__host, self.__port)
+
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.__host}', 'Content-Type: application/json']
+        head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        head.append(f'Content-Length: {len(body)}')
+
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+
+            while size := int((await reader.readline()).strip(), 16):
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+
+            await reader.readline()
+            content = b''.join(chunks)
+        else:
+            content = await reader.readexactly(int(response_headers.get('content-length', 0)))
+
+        if response_headers.get('connection') == 'close':
+            writer.close()
+        else:
+            self.__idle.append((reader, writer))
+
+        return status, content
+
+    def close(self) -> None:
+        for _, writer in self.__idle:
+            writer.close()
+
+        self.__idle.clear()
+
+
+@dataclass
+class Stats:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def add(self, endpoint: str, status: int, latency: float) -> None:
+        self.latencies[endpoint].append(latency)
+
+        if status >= 400:
+            self.errors[endpoint] += 1
+
+
+def ticker_name(index: int) -> str:
+    letters = ''
+
+    for _ in range(3):
+        index, rest = divmod(index, 26)
+        letters = chr(ord('A') + rest) + letters
+
+    return f'BN{letters}'
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1)))]
+
+
+async def read_db_metrics(client: Client) -> dict[str, dict[str, float]]:
+    _, content = await client.request('GET', '/metrics')
+    result: dict[str, dict[str, float]] = defaultdict(dict)
+
+    for line in content.decode().splitlines():
+        if match := METRIC_PATTERN.match(line):
+            name, kind, route, value = match.groups()
+            result[route][f'{name}_{kind}'] = float(value)
+
+    return result
+
+
+async def warm_up(client: Client, api_keys: list[str], tickers: list[str], depth: int, mid: int) -> None:
+    for index, ticker in enumerate(tickers):
+        orders = [
+            {'ticker': ticker, 'direction': 'BUY', 'qty': 10, 'price': mid - level} for level in range(1, depth + 1)
+        ] + [
+            {'ticker': ticker, 'direction': 'SELL', 'qty': 10, 'price': mid + level} for level in range(1, depth + 1)
+        ]
+
+        for start in range(0, len(orders), 100):
+            status, content = await client.request(
+                'POST', '/api/v1/order/batch',
+                {'Authorization': f'TOKEN {api_keys[index % len(api_keys)]}'},
+                orjson.dumps(orders[start:start + 100])
+            )
+
+            if status != 200:
+                raise RuntimeError(f'Не удалось заполнить стакан {ticker}: {status} {content!r}')
+
+
+async def run_worker(
+    client: Client,
+    arguments: argparse.Namespace,
+    api_keys: list[str],
+    tickers: list[str],
+    stats: Stats,
+    deadline: float
+) -> None:
+    resting: dict[str, list[str]] = defaultdict(list)
+
+    while time.perf_counter() < deadline:
+        api_key = random.choice(api_keys)
+        ticker = random.choice(tickers)
+        headers = {'Authorization': f'TOKEN {api_key}'}
+
+        roll = random.random()
+
+        if roll < arguments.cancel_ratio and resting[api_key]:
+            endpoint = 'DELETE /order/{order_id}'
+            order_id = resting[api_key].pop(random.randrange(len(resting[api_key])))
+            request = ('DELETE', f'/api/v1/order/{order_id}', headers, b'')
+        elif roll < arguments.cancel_ratio + arguments.read_ratio:
+            if random.random() < 0.5:
+                endpoint = 'GET /public/orderbook/{ticker}'
+                request = ('GET', f'/api/v1/public/orderbook/{ticker}?limit=10', None, b'')
+            else:
+                endpoint = 'GET /order'
+                request = ('GET', '/api/v1/order?status=NEW&status=PARTIALLY_EXECUTED&limit=100', headers, b'')
+        else:
+            endpoint = 'POST /order'
+            order = {'ticker': ticker, 'direction': random.choice(('BUY', 'SELL')), 'qty': random.randint(1, 10)}
+
+            if random.random() >= arguments.market_ratio:
+                order['price'] = arguments.mid_price + random.randint(-arguments.spread, arguments.spread)
+
+            request = ('POST', '/api/v1/order', headers, orjson.dumps(order))
+
+        start_time = time.perf_counter()
+        status, content = await client.request(*request)
+        stats.add(endpoint, status, time.perf_counter() - start_time)
+
+        if endpoint == 'POST /order' and status == 200 and 'price' in order:
+            resting[api_key].append(orjson.loads(content)['order_id'])
+
+
+def report(stats: Stats, duration: float, before: dict, after: dict) -> None:
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+
+    print(f'\nВсего запросов: {total}, пропускная способность: {total / duration:.1f} req/s\n')
+    print(f'{"Эндпоинт":<36}{"Запросы":>10}{"Ошибки":>10}{"req/s":>10}{"p50, мс":>10}{"p99, мс":>10}')
+
+    for endpoint, latencies in sorted(stats.latencies.items()):
+        print(
+            f'{endpoint:<36}{len(latencies):>10}{stats.errors[endpoint]:>10}{len(latencies) / duration:>10.1f}'
+            f'{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}'
+        )
+
+    print(f'\n{"Маршрут":<36}{"Запросы":>10}{"Запросов к БД":>16}{"Время БД, мс":>16}')
+
+    for route, values in sorted(after.items()):
+        previous = before.get(route, {})
+
+        count = values.get('http_request_db_queries_count', 0) - previous.get('http_request_db_queries_count', 0)
+
+        if route == '/metrics' or count <= 0:
+            continue
+
+        queries = values.get('http_request_db_queries_sum', 0) - previous.get('http_request_db_queries_sum', 0)
+        seconds = (
+            values.get('http_request_db_duration_seconds_sum', 0)
+            - previous.get('http_request_db_duration_seconds_sum', 0)
+        )
+
+        print(f'{route:<36}{int(count):>10}{queries / count:>16.2f}{seconds / count * 1000:>16.3f}')
+
+
+async def benchmark(client: Client, arguments: argparse.Namespace, api_keys: list[str], tickers: list[str]) -> None:
+    await warm_up(client, api_keys, tickers, arguments.depth, arguments.mid_price)
+    logger.info(f'Стаканы заполнены на глубину {arguments.depth}')
+
+    before = await read_db_metrics(client)
+
+    stats = Stats()
+    start_time = time.perf_counter()
+    deadline = start_time + arguments.duration
+
+    await asyncio.gather(*(
+        run_worker(client, arguments, api_keys, tickers, stats, deadline) for _ in range(arguments.concurrency)
+    ))
+
+    duration = time.perf_counter() - start_time
+    after = await read_db_metrics(client)
+
+    report(stats, duration, before, after)
+
+
+async def wait_for_server(client: HttpClient, process: asyncio.subprocess.Process) -> None:
+    while process.returncode is None:
+        try:
+            await client.request('GET', '/metrics')
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+
+    raise RuntimeError('uvicorn завершился до начала нагрузки')
+
+
+async def main(arguments: argparse.Namespace) -> int:
+    if not arguments.force and settings.database.host not in ('localhost', '127.0.0.1', 'postgres'):
+        logger.error(f'База {settings.database.host} не похожа на локальную, запуск отменён (используйте --force)')
+        return 1
+
+    tickers = [ticker_name(index) for index in range(arguments.tickers)]
+
+    await database.connect()
+
+    async with database.get_connection() as connection:
+        await create(connection)
+        api_keys = await seed(connection, arguments.users, tickers, arguments.balance)
+
+    await database.close()
+
+    if arguments.port is None:
+        from core.methods.lifespan import Lifespan
+        from main import app
+
+        async with Lifespan.run(app):
+            await benchmark(AsgiClient(app), arguments, api_keys, tickers)
+
+        return 0
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'uvicorn', 'main:app', '--port', f'{arguments.port}', '--no-access-log',
+        cwd=SRC_DIR
+    )
+
+    client = HttpClient('127.0.0.1', arguments.port)
+
+    try:
+        await wait_for_server(client, process)
+        await benchmark(client, arguments, api_keys, tickers)
+    finally:
+        client.close()
+        process.terminate()
+        await process.wait()
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест API на локальном Postgres '
+                    '(например, docker compose up -d postgres и database__host=localhost)'
+    )
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tickers', type=int, default=4)
+    parser.add_argument('--balance', type=int, default=1_000_000_000)
+    parser.add_argument('--depth', type=int, default=50)
+    parser.add_argument('--mid-price', type=int, default=1000)
+    parser.add_argument('--spread', type=int, default=20)
+    parser.add_argument('--market-ratio', type=float, default=0.2)
+    parser.add_argument('--cancel-ratio', type=float, default=0.1)
+    parser.add_argument('--read-ratio', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--port', type=int, default=None, help='запустить uvicorn на этом порту вместо ASGI в процессе')
+    parser.add_argument('--force', action='store_true')
+
+    exit(asyncio.run(main(parser.parse_args())))
@@ -1,57 +1,350 @@
+import argparse
 import asyncio
+import uuid
+from datetime import datetime, timezone
 
-from asyncpg import DuplicateObjectError, DuplicateTableError
+import orjson
+from asyncpg import DuplicateObjectError, DuplicateTableError, Connection
 from everbase import compile_table, Insert
+from loguru import logger
 
 from core.models.balance import Balance
+from core.models.candle import Candle
+from core.models.engine_state import EngineState
 from core.models.instrument import Instrument
 from core.models.order import Order
 from core.models.transaction import Transaction
 from core.models.user import User
+from core.config.settings import settings
 from core.objects.database import database
+from modules.archive.partitions import create_partitions
 
+MIGRATIONS: list[tuple[int, list[str]]] = [
+    (1, [
+        "ALTER TABLE balances ADD COLUMN IF NOT EXISTS reserved INTEGER NOT NULL DEFAULT 0;",
+        """
+        UPDATE balances SET reserved = r.reserved
+        FROM (
+            SELECT user_id, ticker, sum(reserved) AS reserved
+            FROM (
+                SELECT user_id, ticker, qty - filled AS reserved FROM orders
+                WHERE direction = 'SELL' AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL
+                UNION ALL
+                SELECT user_id, 'RUB', (qty - filled) * price FROM orders
+                WHERE direction = 'BUY' AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL
+            ) AS o
+            GROUP BY user_id, ticker
+        ) AS r
+        WHERE balances.user_id = r.user_id AND balances.ticker = r.ticker;
+        """
+    ]),
+    (2, [
+        """
+        CREATE INDEX IF NOT EXISTS orders_book_idx
+        ON orders (ticker, direction, price, timestamp) INCLUDE (id, user_id, qty, filled)
+        WHERE status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS orders_user_id_idx
+        ON orders (user_id, timestamp, id);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS orders_user_id_active_idx
+        ON orders (user_id, timestamp, id)
+        WHERE status IN ('NEW', 'PARTIALLY_EXECUTED');
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transactions_ticker_timestamp_idx
+        ON transactions (ticker, timestamp DESC) INCLUDE (amount, price);
+        """
+    ]),
+    (3, [
+        """
+        INSERT INTO candles (ticker, interval, bucket, open, high, low, close, volume)
+        SELECT DISTINCT ON (t.ticker, i.interval, t.bucket)
+            t.ticker, i.interval, t.bucket,
+            first_value(t.price) OVER w, max(t.price) OVER w, min(t.price) OVER w,
+            last_value(t.price) OVER w, sum(t.amount) OVER w
+        FROM (VALUES ('1m', 60), ('5m', 300), ('1h', 3600), ('1d', 86400)) AS i(interval, seconds)
+        CROSS JOIN LATERAL (
+            SELECT ticker, price, amount, timestamp,
+                to_timestamp(floor(extract(epoch FROM timestamp) / i.seconds) * i.seconds) AS bucket
+            FROM transactions
+        ) AS t
+        WINDOW w AS (
+            PARTITION BY t.ticker, i.interval, t.bucket ORDER BY t.timestamp
+            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        )
+        ON CONFLICT (ticker, interval, bucket) DO NOTHING;
+        """
+    ]),
+    (4, [
+        """
+        CREATE OR REPLACE FUNCTION create_partitions(parent TEXT, since TIMESTAMPTZ, ahead INTEGER)
+        RETURNS INTEGER AS $$
+        DECLARE
+            bound TIMESTAMP;
+            created INTEGER := 0;
+        BEGIN
+            FOR bound IN
+                SELECT generate_series(
+                    date_trunc('month', since AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => ahead),
+                    INTERVAL '1 month'
+                )
+            LOOP
+                IF to_regclass(parent || '_' || to_char(bound, 'YYYYMM')) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        parent || '_' || to_char(bound, 'YYYYMM'), parent,
+                        bound AT TIME ZONE 'UTC', (bound + INTERVAL '1 month') AT TIME ZONE 'UTC'
+                    );
 
-async def main():
-    await database.connect()
+                    created := created + 1;
+                END IF;
+            END LOOP;
 
-    tables = [User, Balance, Instrument, Order, Transaction]
+            RETURN created;
+        END
+        $$ LANGUAGE plpgsql;
+        """,
+        "ALTER TABLE transactions RENAME TO transactions_legacy;",
+        """
+        CREATE TABLE transactions (
+            id UUID NOT NULL DEFAULT uuid_generate_v4(),
+            ticker TEXT NOT NULL REFERENCES instruments (ticker) ON DELETE CASCADE,
+            amount INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            buyer_user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            seller_user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            buyer_order_id UUID NOT NULL,
+            seller_order_id UUID NOT NULL,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT now(),
+            CONSTRAINT transactions_pk PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        """,
+        """
+        SELECT create_partitions('transactions', coalesce((SELECT min(timestamp) FROM transactions_legacy), now()), 3);
+        """,
+        """
+        INSERT INTO transactions (
+            id, ticker, amount, price, buyer_user_id, seller_user_id, buyer_order_id, seller_order_id, timestamp
+        )
+        SELECT id, ticker, amount, price, buyer_user_id, seller_user_id, buyer_order_id, seller_order_id, timestamp
+        FROM transactions_legacy;
+        """,
+        "DROP TABLE transactions_legacy;",
+        """
+        CREATE INDEX transactions_ticker_timestamp_idx
+        ON transactions (ticker, timestamp DESC) INCLUDE (amount, price);
+        """,
+        """
+        CREATE TABLE orders_archive (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ticker TEXT NOT NULL REFERENCES instruments (ticker) ON DELETE CASCADE,
+            direction Direction NOT NULL,
+            status OrderStatus NOT NULL,
+            qty INTEGER NOT NULL,
+            filled INTEGER NOT NULL,
+            price INTEGER,
+            timestamp TIMESTAMPTZ NOT NULL,
+            CONSTRAINT orders_archive_pk PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        """,
+        """
+        CREATE INDEX orders_archive_user_id_idx
+        ON orders_archive (user_id, timestamp, id);
+        """,
+        """
+        CREATE INDEX orders_archivable_idx
+        ON orders (timestamp)
+        WHERE status IN ('EXECUTED', 'CANCELLED');
+        """
+    ])
+]
 
-    async with database.get_connection() as connection:
-        try:
-            await connection.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";')
-        except DuplicateObjectError:
-            pass
+PLANS: list[tuple[str, str, tuple]] = [
+    (
+        'orders_book_idx',
+        """
+        SELECT id, user_id, price, qty, filled FROM orders
+        WHERE ticker = $1 AND direction = $2 AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL
+        ORDER BY price, timestamp
+        """,
+        ('RUB', 'SELL')
+    ),
+    (
+        'transactions_ticker_timestamp_idx',
+        "SELECT ticker, amount, price, timestamp FROM transactions WHERE ticker = $1 ORDER BY timestamp DESC LIMIT 10",
+        ('RUB',)
+    ),
+    (
+        'orders_user_id_idx',
+        "SELECT * FROM orders WHERE user_id = $1 ORDER BY timestamp, id",
+        (uuid.UUID(int=0),)
+    ),
+    (
+        'orders_user_id_idx',
+        "SELECT * FROM orders WHERE user_id = $1 AND (timestamp, id) > ($2, $3) ORDER BY timestamp, id LIMIT 1000",
+        (uuid.UUID(int=0), datetime.fromtimestamp(0, timezone.utc), uuid.UUID(int=0))
+    ),
+    (
+        'orders_user_id_active_idx',
+        "SELECT * FROM orders WHERE user_id = $1 AND status IN ('NEW', 'PARTIALLY_EXECUTED') ORDER BY timestamp, id",
+        (uuid.UUID(int=0),)
+    ),
+    (
+        'orders_archivable_idx',
+        "SELECT id FROM orders WHERE status IN ('EXECUTED', 'CANCELLED') AND timestamp < $1 LIMIT 10000",
+        (datetime.now(timezone.utc),)
+    )
+]
 
-        try:
-            await connection.execute("CREATE TYPE UserRole AS ENUM('USER', 'ADMIN');")
-        except DuplicateObjectError:
-            pass
+SELECT_ROOT_INDEXES = """
+    SELECT array_agg(coalesce(pg_partition_root(name::regclass), name::regclass)::text)
+    FROM unnest($1::text[]) AS name
+"""
 
-        try:
-            await connection.execute("CREATE TYPE Direction AS ENUM('BUY', 'SELL');")
-        except DuplicateObjectError:
-            pass
 
+async def migrate(connection: Connection):
+    await connection.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now());"
+    )
+
+    applied = {record['version'] for record in await connection.fetch('SELECT version FROM schema_migrations;')}
+
+    for version, statements in MIGRATIONS:
+        if version in applied:
+            continue
+
+        async with connection.transaction():
+            for statement in statements:
+                await connection.execute(statement)
+
+            await connection.execute('INSERT INTO schema_migrations (version) VALUES ($1);', version)
+
+        logger.info(f'Миграция {version} применена')
+
+
+def get_index_names(plan: dict) -> set[str]:
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+
+    for subplan in plan.get('Plans', []):
+        names |= get_index_names(subplan)
+
+    return names
+
+
+async def check_plans(connection: Connection) -> bool:
+    is_success = True
+
+    for index_name, query, args in PLANS:
+        async with connection.transaction():
+            await connection.execute('SET LOCAL enable_seqscan = off;')
+            plan = orjson.loads(await connection.fetchval(f'EXPLAIN (FORMAT JSON) {query}', *args))[0]['Plan']
+
+        index_names = get_index_names(plan)
+        index_names.update(await connection.fetchval(SELECT_ROOT_INDEXES, list(index_names)) or [])
+
+        if index_name in index_names:
+            logger.info(f'План использует {index_name}')
+        else:
+            logger.error(f'План не использует {index_name}: {plan}')
+            is_success = False
+
+    return is_success
+
+
+async def create(connection: Connection):
+    tables = [User, Balance, Instrument, Order, Transaction, Candle, EngineState]
+
+    try:
+        await connection.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";')
+    except DuplicateObjectError:
+        pass
+
+    try:
+        await connection.execute("CREATE TYPE UserRole AS ENUM('USER', 'ADMIN');")
+    except DuplicateObjectError:
+        pass
+
+    try:
+        await connection.execute("CREATE TYPE Direction AS ENUM('BUY', 'SELL');")
+    except DuplicateObjectError:
+        pass
+
+    try:
+        await connection.execute("CREATE TYPE OrderStatus AS ENUM('NEW', 'EXECUTED', 'PARTIALLY_EXECUTED', 'CANCELLED');")
+    except DuplicateObjectError:
+        pass
+
+    for table in tables:
         try:
-            await connection.execute("CREATE TYPE OrderStatus AS ENUM('NEW', 'EXECUTED', 'PARTIALLY_EXECUTED', 'CANCELLED');")
-        except DuplicateObjectError:
+            await connection.execute(compile_table(table))
+        except DuplicateTableError:
             pass
 
-        for table in tables:
-            try:
-                await connection.execute(compile_table(table))
-            except DuplicateTableError:
-                pass
-
-        await (
-            Insert(Instrument)
-            .values(ticker='RUB', name='Российский рубль')
-            .on_conflict_do_nothing()
-            .fetch_all(connection)
+    await migrate(connection)
+
+    if created := await create_partitions(connection, 'transactions', None, settings.archive.partitions_ahead):
+        logger.info(f'Создано партиций сделок: {created}')
+
+    await (
+        Insert(Instrument)
+        .values(ticker='RUB', name='Российский рубль')
+        .on_conflict_do_nothing()
+        .fetch_all(connection)
+    )
+
+
+async def seed(connection: Connection, users: int, tickers: list[str], amount: int) -> list[str]:
+    api_keys = [f'{uuid.uuid4()}' for _ in range(users)]
+
+    async with connection.transaction():
+        await connection.execute("DELETE FROM users WHERE name = 'benchmark';")
+        await connection.execute('DELETE FROM instruments WHERE ticker = ANY($1::text[]);', tickers)
+
+        await connection.execute(
+            'INSERT INTO instruments (ticker, name) SELECT ticker, ticker FROM unnest($1::text[]) AS ticker;',
+            tickers
         )
 
+        user_ids = [
+            record['id'] for record in await connection.fetch(
+                "INSERT INTO users (name, api_key) SELECT 'benchmark', api_key FROM unnest($1::text[]) AS api_key RETURNING id;",
+                api_keys
+            )
+        ]
+
+        await connection.execute(
+            """
+            INSERT INTO balances (user_id, ticker, amount)
+            SELECT user_id, ticker, $3 FROM unnest($1::uuid[]) AS user_id CROSS JOIN unnest($2::text[]) AS ticker;
+            """,
+            user_ids, ['RUB', *tickers], amount
+        )
+
+    logger.info(f'Создано {users} пользователей и {len(tickers)} инструментов')
+
+    return api_keys
+
+
+async def main(is_check_plans: bool) -> int:
+    await database.connect()
+
+    async with database.get_connection() as connection:
+        await create(connection)
+
+        is_success = await check_plans(connection) if is_check_plans else True
+
     await database.close()
 
+    return 0 if is_success else 1
+
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check-plans', action='store_true')
+
+    exit(asyncio.run(main(parser.parse_args().check_plans)))
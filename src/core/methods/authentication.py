@@ -1,26 +1,39 @@
 import uuid
 from typing import Annotated
 
-from everbase import Select
 from fastapi import HTTPException
 from fastapi.params import Depends
 from fastapi.security import APIKeyHeader
 
-from core.models.user import User
+from core.config.settings import settings
+from core.methods.cache import TTLCache, MISSING
 from core.objects.database import database
+from core.objects.statements import statements
 from core.schemes.user import UserRole
 from modules.users.schemes import UserModel
 
 authorization_header = APIKeyHeader(name="authorization")
 
+SELECT_USER = statements.register('select_user', "SELECT id, name, role, api_key FROM users WHERE api_key = $1")
+
 
 class Authentication:
+    cache = TTLCache(
+        name='authentication',
+        max_size=settings.authentication.cache_size,
+        ttl=settings.authentication.cache_ttl,
+        negative_ttl=settings.authentication.negative_cache_ttl
+    )
 
     def __init__(self, *, user_role: UserRole):
         self.__user_role = user_role
 
-    @staticmethod
-    async def __get_user(authorization: str) -> UserModel:
+    @classmethod
+    def invalidate(cls, api_key: str) -> None:
+        cls.cache.delete(api_key)
+
+    @classmethod
+    async def __get_user(cls, authorization: str) -> UserModel:
         try:
             scheme, token = authorization.split(' ', 1)
         except ValueError:
@@ -34,11 +47,15 @@ class Authentication:
         except ValueError:
             raise HTTPException(status_code=403, detail="Токен не валиден")
 
-        user = await (
-            Select(User.id, User.name, User.role, User.api_key)
-            .where(User.api_key == token)
-            .fetch_one(database, model=UserModel)
-        )
+        user = cls.cache.get(token)
+
+        if user is MISSING:
+            async with database.get_connection() as connection:
+                record = await connection.fetchrow_statement(SELECT_USER, token)
+
+            user = UserModel(**record) if record is not None else None
+
+            cls.cache.set(token, user)
 
         if user is None:
             raise HTTPException(status_code=403, detail="Токен не валиден")
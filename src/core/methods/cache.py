@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from core.objects.metrics import cache_requests, cache_size
+
+MISSING = object()
+
+
+class TTLCache:
+
+    def __init__(self, *, name: str, max_size: int, ttl: float, negative_ttl: float):
+        self.__name = name
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+
+        self.__items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def get(self, key: Hashable) -> Any:
+        item = self.__items.get(key)
+
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self.__items[key]
+
+            self.misses += 1
+            return MISSING
+
+        self.__items.move_to_end(key)
+
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        ttl = self.__ttl if value is not None else self.__negative_ttl
+
+        self.__items[key] = (time.monotonic() + ttl, value)
+        self.__items.move_to_end(key)
+
+        if len(self.__items) > self.__max_size:
+            self.__items.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self.__items.pop(key, None)
+
+    def collect(self) -> None:
+        cache_requests.set(self.hits, self.__name, 'hit')
+        cache_requests.set(self.misses, self.__name, 'miss')
+        cache_size.set(len(self.__items), self.__name)
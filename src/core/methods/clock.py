@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta, timezone
+
+
+class Clock:
+    TICK = timedelta(microseconds=1)
+
+    def __init__(self):
+        self.__last = datetime.min.replace(tzinfo=timezone.utc)
+
+    def next(self) -> datetime:
+        timestamp = datetime.now(timezone.utc)
+
+        if timestamp <= self.__last:
+            timestamp = self.__last + self.TICK
+
+        self.__last = timestamp
+
+        return timestamp
@@ -1,17 +1,85 @@
+import asyncio
 import os
+import uuid
 from contextlib import asynccontextmanager
 from sys import stderr
 
+import orjson
+from asyncpg import PostgresError
 from fastapi import FastAPI
 from loguru import logger
 
-from core.objects.database import database
+from core.config.settings import settings
+from core.methods.authentication import Authentication
+from core.objects.database import database, read_database
+from core.objects.instruments import instruments
+from core.objects.journal import journal
+from core.objects.ledger import ledger
+from core.objects.order_books import order_books
+from core.objects.sequencer import sequencer
+from core.objects.shard import shard
+from core.objects.writer import writer
+from modules.archive.partitions import create_partitions
+from modules.orders.dispatch import submit_drop_instrument, submit_drop_user
+from modules.orders.methods import recover_book
 
 
 class Lifespan:
+    __tasks: set[asyncio.Task] = set()
+    __maintenance: asyncio.Task | None = None
 
     @staticmethod
-    async def __on_startup():
+    async def __refresh_instruments():
+        async with database.get_connection() as connection:
+            removed = await instruments.load(connection)
+
+        await asyncio.gather(*(submit_drop_instrument(ticker) for ticker in removed))
+
+        logger.info('Список инструментов обновлён')
+
+    @classmethod
+    def __on_instruments_changed(cls, _: str):
+        task = asyncio.create_task(cls.__refresh_instruments())
+
+        cls.__tasks.add(task)
+        task.add_done_callback(cls.__tasks.discard)
+
+    @staticmethod
+    async def __maintain_partitions():
+        while True:
+            try:
+                async with database.get_connection() as connection:
+                    created = await create_partitions(
+                        connection, 'transactions', None, settings.archive.partitions_ahead
+                    )
+
+                if created:
+                    logger.info(f'Создано партиций сделок: {created}')
+            except PostgresError as error:
+                logger.error(f'Не удалось создать партиции сделок: {error}')
+
+            await asyncio.sleep(settings.archive.maintenance_interval)
+
+    @classmethod
+    def __on_write_failed(cls, ticker: str):
+        task = asyncio.create_task(sequencer.submit(ticker, recover_book, ticker))
+
+        cls.__tasks.add(task)
+        task.add_done_callback(cls.__tasks.discard)
+
+    @classmethod
+    def __on_user_deleted(cls, payload: str):
+        user = orjson.loads(payload)
+
+        Authentication.invalidate(user['api_key'])
+
+        task = asyncio.create_task(submit_drop_user(uuid.UUID(user['id'])))
+
+        cls.__tasks.add(task)
+        task.add_done_callback(cls.__tasks.discard)
+
+    @classmethod
+    async def __on_startup(cls):
         logger.remove()
 
         logger.add(
@@ -34,10 +102,51 @@ class Lifespan:
         )
 
         await database.connect()
+        await read_database.connect()
+
+        if writer.is_enabled and shard.is_enabled:
+            raise RuntimeError('Асинхронная запись поддерживается только с одним воркером')
+
+        sequencer.start()
+
+        if shard.is_enabled:
+            await shard.start(await database.hold())
+
+        journal.open(shard.slot)
+
+        if shard.slot == 0:
+            cls.__maintenance = asyncio.create_task(cls.__maintain_partitions())
+
+        async with database.get_connection() as connection:
+            await instruments.load(connection)
+            await order_books.load(connection, [ticker for ticker in instruments if shard.is_local(ticker)])
+
+            if writer.is_enabled:
+                await ledger.load(connection)
+
+        if settings.instruments.listen or shard.is_enabled:
+            await database.listen('instruments', cls.__on_instruments_changed)
+
+        if shard.is_enabled:
+            await database.listen('users', cls.__on_user_deleted)
+
+        if writer.is_enabled:
+            writer.listen(cls.__on_write_failed)
+            writer.start()
+
         logger.info('API запушен')
 
-    @staticmethod
-    async def __on_shutdown():
+    @classmethod
+    async def __on_shutdown(cls):
+        if cls.__maintenance is not None:
+            cls.__maintenance.cancel()
+            cls.__maintenance = None
+
+        await shard.stop()
+        await sequencer.stop()
+        await writer.stop()
+        journal.close()
+        await read_database.close()
         await database.close()
 
         logger.info('API остановлен')
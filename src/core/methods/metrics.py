@@ -0,0 +1,153 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TypeVar
+
+T = TypeVar('T', bound='Metric')
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+@dataclass(slots=True)
+class QueryStats:
+    count: int = 0
+    time: float = 0
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        labels.append(extra)
+
+    return f'{{{",".join(labels)}}}' if labels else ''
+
+
+class Metric:
+    TYPE: str
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return '\n'.join([
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.TYPE}',
+            *self.samples()
+        ])
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self.__values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self.__values[labels] = value
+
+    def samples(self) -> list[str]:
+        return [
+            f'{self.name}{format_labels(self.labels, labels)} {value}'
+            for labels, value in self.__values.items()
+        ]
+
+
+class Counter(Gauge):
+    TYPE = 'counter'
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+
+        self.__buckets = buckets
+        self.__values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self.__values.get(labels)
+
+        if state is None:
+            state = self.__values[labels] = ([0] * (len(self.__buckets) + 1), [0])
+
+        state[0][bisect_left(self.__buckets, value)] += 1
+        state[1][0] += value
+
+    def samples(self) -> list[str]:
+        samples = []
+
+        for labels, (counts, total) in self.__values.items():
+            cumulative = 0
+
+            for bound, count in zip((*self.__buckets, '+Inf'), counts):
+                cumulative += count
+                bucket = f'le="{bound}"'
+                samples.append(f'{self.name}_bucket{format_labels(self.labels, labels, bucket)} {cumulative}')
+
+            samples.append(f'{self.name}_sum{format_labels(self.labels, labels)} {total[0]}')
+            samples.append(f'{self.name}_count{format_labels(self.labels, labels)} {cumulative}')
+
+        return samples
+
+
+def parse_value(value: str) -> int | float:
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def merge(expositions: list[bytes]) -> bytes:
+    families: dict[str, dict[str, int | float | None]] = {}
+
+    for exposition in expositions:
+        family: dict[str, int | float | None] = {}
+
+        for line in exposition.decode().splitlines():
+            if line.startswith('# HELP'):
+                family = families.setdefault(line, {})
+            elif line.startswith('#'):
+                family.setdefault(line, None)
+            else:
+                sample, _, value = line.rpartition(' ')
+                family[sample] = family.get(sample, 0) + parse_value(value)
+
+    return ('\n'.join(
+        line if value is None else f'{line} {value}'
+        for help_line, family in families.items()
+        for line, value in ((help_line, None), *family.items())
+    ) + '\n').encode()
+
+
+class Registry:
+
+    def __init__(self):
+        self.__metrics: list[Metric] = []
+
+    def register(self, metric: T) -> T:
+        self.__metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        return ('\n'.join(metric.render() for metric in self.__metrics) + '\n').encode()
@@ -0,0 +1,147 @@
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import AsyncIterator, Callable
+
+import asyncpg
+from asyncpg import Connection, Pool, Record
+from asyncpg.prepared_stmt import PreparedStatement
+
+from core.methods.metrics import query_stats
+from core.methods.statements import Statement
+from core.objects.metrics import pool_acquire_duration, pool_size
+from core.objects.statements import statements
+from core.schemes.settings import DatabaseSettings, PoolSettings
+
+
+def metered(method):
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if (stats := query_stats.get()) is None:
+            return await method(self, *args, **kwargs)
+
+        start_time = time.perf_counter()
+
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            stats.count += 1
+            stats.time += time.perf_counter() - start_time
+
+    return wrapper
+
+
+async def bulk_insert(
+    connection: Connection,
+    table: str,
+    columns: list[str],
+    records: list[tuple],
+    query: str,
+    threshold: int
+) -> None:
+    if len(records) >= threshold:
+        await connection.copy_records_to_table(table, records=records, columns=columns)
+        return
+
+    await connection.execute(query, *map(list, zip(*records)))
+
+
+class MeteredConnection(Connection):
+    execute = metered(Connection.execute)
+    executemany = metered(Connection.executemany)
+    fetch = metered(Connection.fetch)
+    fetchval = metered(Connection.fetchval)
+    fetchrow = metered(Connection.fetchrow)
+    copy_records_to_table = metered(Connection.copy_records_to_table)
+
+    prepared: dict[str, PreparedStatement] = {}
+
+    @metered
+    async def fetch_statement(self, statement: Statement, *args) -> list[Record]:
+        if (prepared := self.prepared.get(statement.name)) is None:
+            return await Connection.fetch(self, statement.query, *args)
+
+        return await prepared.fetch(*args)
+
+    @metered
+    async def fetchrow_statement(self, statement: Statement, *args) -> Record | None:
+        if (prepared := self.prepared.get(statement.name)) is None:
+            return await Connection.fetchrow(self, statement.query, *args)
+
+        return await prepared.fetchrow(*args)
+
+    @metered
+    async def fetchval_statement(self, statement: Statement, *args):
+        if (prepared := self.prepared.get(statement.name)) is None:
+            return await Connection.fetchval(self, statement.query, *args)
+
+        return await prepared.fetchval(*args)
+
+
+class ConnectionPool:
+
+    def __init__(self, name: str, database: DatabaseSettings, pool: PoolSettings):
+        self.__name = name
+        self.__database = database
+        self.__settings = pool
+
+        self.__pool: Pool | None = None
+        self.__held: list[Connection] = []
+
+    @property
+    def size(self) -> int:
+        return self.__pool.get_size() if self.__pool is not None else 0
+
+    @property
+    def idle_size(self) -> int:
+        return self.__pool.get_idle_size() if self.__pool is not None else 0
+
+    async def connect(self) -> None:
+        self.__pool = await asyncpg.create_pool(
+            host=self.__database.host,
+            port=self.__database.port,
+            user=self.__database.user,
+            password=self.__database.password,
+            database=self.__database.name,
+            min_size=self.__settings.min_size,
+            max_size=self.__settings.max_size,
+            statement_cache_size=self.__settings.statement_cache_size,
+            connection_class=MeteredConnection,
+            init=statements.prepare if self.__settings.statement_cache_size > 0 else None
+        )
+
+    async def close(self) -> None:
+        for connection in self.__held:
+            await self.__pool.release(connection)
+
+        self.__held.clear()
+
+        if self.__pool is not None:
+            await self.__pool.close()
+            self.__pool = None
+
+    def collect(self) -> None:
+        pool_size.set(self.size, self.__name, 'total')
+        pool_size.set(self.idle_size, self.__name, 'idle')
+
+    async def hold(self) -> Connection:
+        connection = await self.__pool.acquire(timeout=self.__settings.acquire_timeout)
+        self.__held.append(connection)
+
+        return connection
+
+    async def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        connection = await self.hold()
+        await connection.add_listener(channel, lambda _, __, ___, payload: callback(payload))
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator[Connection]:
+        start_time = time.perf_counter()
+        connection = await self.__pool.acquire(timeout=self.__settings.acquire_timeout)
+
+        pool_acquire_duration.observe(time.perf_counter() - start_time, self.__name)
+
+        try:
+            yield connection
+        finally:
+            await self.__pool.release(connection)
@@ -0,0 +1,61 @@
+import asyncio
+import contextvars
+from typing import Callable, Awaitable, Any
+
+from loguru import logger
+
+
+class Sequencer:
+
+    def __init__(self):
+        self.__queues: dict[str, asyncio.Queue] = {}
+        self.__workers: dict[str, asyncio.Task] = {}
+        self.__is_running = False
+
+    def start(self) -> None:
+        self.__is_running = True
+
+    async def stop(self) -> None:
+        self.__is_running = False
+
+        for queue in self.__queues.values():
+            queue.put_nowait(None)
+
+        await asyncio.gather(*self.__workers.values(), return_exceptions=True)
+
+        self.__queues.clear()
+        self.__workers.clear()
+
+    async def submit(self, key: str, function: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        if not self.__is_running:
+            raise RuntimeError('Sequencer не запущен')
+
+        queue = self.__queues.get(key)
+
+        if queue is None:
+            queue = self.__queues[key] = asyncio.Queue()
+            self.__workers[key] = asyncio.create_task(self.__worker(key, queue))
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((future, function, args, contextvars.copy_context()))
+
+        return await future
+
+    @staticmethod
+    async def __worker(key: str, queue: asyncio.Queue) -> None:
+        while (item := await queue.get()) is not None:
+            future, function, args, context = item
+
+            if future.cancelled():
+                continue
+
+            try:
+                result = await asyncio.create_task(function(*args), context=context)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+        logger.debug(f'Очередь {key} остановлена')
@@ -0,0 +1,27 @@
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Mapping
+
+import orjson
+
+
+def as_str(key: str) -> Callable[[Mapping], str]:
+    getter = itemgetter(key)
+    return lambda record: str(getter(record))
+
+
+class RecordSerializer:
+
+    def __init__(self, fields: dict[str, str | Callable[[Mapping], Any]]):
+        self.__fields: tuple[tuple[str, Callable[[Mapping], Any]], ...] = tuple(
+            (key, itemgetter(value) if isinstance(value, str) else value)
+            for key, value in fields.items()
+        )
+
+    def __call__(self, record: Mapping) -> dict:
+        return {key: getter(record) for key, getter in self.__fields}
+
+    def dumps(self, record: Mapping) -> bytes:
+        return orjson.dumps(self(record))
+
+    def dumps_many(self, records: Iterable[Mapping]) -> bytes:
+        return orjson.dumps([self(record) for record in records])
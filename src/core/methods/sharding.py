@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import os
+from bisect import bisect
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import orjson
+from asyncpg import Connection
+from fastapi import HTTPException
+from loguru import logger
+
+SHARD_LOCK_KEY = 0x746F6368
+
+
+class HashRing:
+
+    def __init__(self, nodes: range, replicas: int = 64):
+        self.__ring = sorted(
+            (self.__hash(f'{node}:{replica}'), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+
+        self.__keys = [key for key, _ in self.__ring]
+
+    @staticmethod
+    def __hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+    def get(self, key: str) -> int:
+        return self.__ring[bisect(self.__keys, self.__hash(key)) % len(self.__ring)][1]
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    try:
+        header = await reader.readexactly(4)
+        return orjson.loads(await reader.readexactly(int.from_bytes(header)))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def write_frame(writer: asyncio.StreamWriter, data: Any) -> None:
+    payload = orjson.dumps(data)
+    writer.write(len(payload).to_bytes(4) + payload)
+
+
+class Peer:
+
+    def __init__(self, path: str):
+        self.__path = path
+        self.__idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def __open(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.open_unix_connection(self.__path)
+        except OSError:
+            raise HTTPException(status_code=503, detail="Сервис временно недоступен")
+
+    async def call(self, method: str, params: dict) -> Any:
+        reader, writer = self.__idle.pop() if self.__idle else await self.__open()
+
+        try:
+            write_frame(writer, {'method': method, 'params': params})
+            await writer.drain()
+
+            response = await read_frame(reader)
+        except BaseException:
+            writer.close()
+            raise
+
+        if response is None:
+            writer.close()
+            raise HTTPException(status_code=503, detail="Сервис временно недоступен")
+
+        self.__idle.append((reader, writer))
+
+        if 'error' in response:
+            raise HTTPException(**response['error'])
+
+        return response['result']
+
+    async def stream(self, method: str, params: dict) -> AsyncIterator[Any]:
+        reader, writer = await self.__open()
+
+        try:
+            write_frame(writer, {'method': method, 'params': params})
+            await writer.drain()
+
+            while (message := await read_frame(reader)) is not None:
+                yield message
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        for _, writer in self.__idle:
+            writer.close()
+
+        self.__idle.clear()
+
+
+class Shard:
+
+    def __init__(self, *, workers: int, socket_dir: str):
+        self.__workers = workers
+        self.__socket_dir = socket_dir
+
+        self.__ring = HashRing(range(workers))
+        self.__slot = 0
+
+        self.__procedures: dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self.__streams: dict[str, Callable[[dict], AsyncIterator[Any]]] = {}
+
+        self.__peers: dict[int, Peer] = {}
+        self.__server: asyncio.Server | None = None
+        self.__clients: set[asyncio.StreamWriter] = set()
+
+    @property
+    def slot(self) -> int:
+        return self.__slot
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.__workers > 1
+
+    def procedure(self, name: str):
+        def decorator(function: Callable[[dict], Awaitable[Any]]):
+            self.__procedures[name] = function
+            return function
+
+        return decorator
+
+    def stream(self, name: str):
+        def decorator(function: Callable[[dict], AsyncIterator[Any]]):
+            self.__streams[name] = function
+            return function
+
+        return decorator
+
+    def is_local(self, ticker: str) -> bool:
+        return not self.is_enabled or self.__ring.get(ticker) == self.__slot
+
+    def __path(self, slot: int) -> str:
+        return os.path.join(self.__socket_dir, f'worker-{slot}.sock')
+
+    def __peer(self, slot: int) -> Peer:
+        peer = self.__peers.get(slot)
+
+        if peer is None:
+            peer = self.__peers[slot] = Peer(self.__path(slot))
+
+        return peer
+
+    async def call(self, ticker: str, method: str, params: dict) -> Any:
+        return await self.__peer(self.__ring.get(ticker)).call(method, params)
+
+    async def broadcast(self, method: str, params: dict) -> list[Any]:
+        return await asyncio.gather(*(
+            self.__peer(slot).call(method, params) for slot in range(self.__workers) if slot != self.__slot
+        ))
+
+    def subscribe(self, ticker: str, method: str, params: dict) -> AsyncIterator[Any]:
+        return self.__peer(self.__ring.get(ticker)).stream(method, params)
+
+    async def __claim_slot(self, connection: Connection) -> int:
+        while True:
+            for slot in range(self.__workers):
+                if await connection.fetchval('SELECT pg_try_advisory_lock($1, $2)', SHARD_LOCK_KEY, slot):
+                    return slot
+
+            logger.warning('Все слоты воркеров заняты, ожидание освобождения')
+            await asyncio.sleep(1)
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.__clients.add(writer)
+
+        try:
+            while (request := await read_frame(reader)) is not None:
+                if request['method'] in self.__streams:
+                    async with aclosing(self.__streams[request['method']](request['params'])) as messages:
+                        async for message in messages:
+                            write_frame(writer, message)
+                            await writer.drain()
+
+                    break
+
+                try:
+                    write_frame(writer, {'result': await self.__procedures[request['method']](request['params'])})
+                except HTTPException as error:
+                    write_frame(writer, {'error': {'status_code': error.status_code, 'detail': error.detail}})
+                except Exception as error:
+                    logger.exception(f'Ошибка при обработке {request["method"]}: {error}')
+                    write_frame(writer, {'error': {'status_code': 500, 'detail': "Внутренняя ошибка сервера"}})
+
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.__clients.discard(writer)
+            writer.close()
+
+    async def start(self, connection: Connection) -> None:
+        self.__slot = await self.__claim_slot(connection)
+
+        os.makedirs(self.__socket_dir, exist_ok=True)
+
+        if os.path.exists(path := self.__path(self.__slot)):
+            os.unlink(path)
+
+        self.__server = await asyncio.start_unix_server(self.__handle, path)
+
+        logger.info(f'Воркер занял слот {self.__slot} из {self.__workers}')
+
+    async def stop(self) -> None:
+        for peer in self.__peers.values():
+            peer.close()
+
+        self.__peers.clear()
+
+        if self.__server is not None:
+            self.__server.close()
+
+            for writer in self.__clients:
+                writer.close()
+
+            await self.__server.wait_closed()
+            self.__server = None
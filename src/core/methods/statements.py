@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+
+from asyncpg import Connection
+
+
+@dataclass(slots=True, frozen=True)
+class Statement:
+    name: str
+    query: str
+
+
+class Statements:
+
+    def __init__(self):
+        self.__statements: dict[str, Statement] = {}
+
+    def register(self, name: str, query: str) -> Statement:
+        if name in self.__statements:
+            raise ValueError(f'Запрос {name} уже зарегистрирован')
+
+        statement = self.__statements[name] = Statement(name, query)
+        return statement
+
+    async def prepare(self, connection: Connection) -> None:
+        connection.prepared = {
+            statement.name: await connection.prepare(statement.query) for statement in self.__statements.values()
+        }
@@ -1,32 +1,70 @@
+import random
 import time
-from typing import Callable, Awaitable
 
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware, _StreamingResponse as StreamingResponse
-from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class LoggerMiddleware(BaseHTTPMiddleware):
+class LoggerMiddleware:
+    REDACTED_HEADERS = frozenset({b'authorization'})
+
+    def __init__(self, app: ASGIApp, *, sample_rate: float = 1, slow_request_time: float = 1):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_request_time = int(slow_request_time * 1_000_000_000)
+
+    def __format_request(self, scope: Scope) -> str:
+        url = scope['path']
+
+        if scope['query_string']:
+            url += f"?{scope['query_string'].decode('latin-1')}"
+
+        headers = {
+            name.decode('latin-1'): '***' if name in self.REDACTED_HEADERS else value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+
+        return f"Request({scope['method']}; {url}; headers={headers})"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next: Callable[[Request], Awaitable[StreamingResponse]]) -> StreamingResponse:
         start_time = time.perf_counter_ns()
+        status_code = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+
+            await send(message)
 
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception as error:
             logger.exception(
-                f'Ошибка в api: {error}.'
-                f'Request({request.method}; {request.url}; headers={request.headers}). '
-                f'Время исполнения: {int((time.perf_counter_ns() - start_time) / 1_000_000)} мс'
+                f'Ошибка в api: {error}. {self.__format_request(scope)}. '
+                f'Время исполнения: {(time.perf_counter_ns() - start_time) // 1_000_000} мс'
             )
 
-            raise error
+            raise
 
-        logger.debug(
-            f'Запрос к api. '
-            f'Request({request.method}; {request.url}; headers={request.headers}). '
-            f'Response({response.status_code}). '
-            f'Время исполнения: {int((time.perf_counter_ns() - start_time) / 1_000_000)} мс'
-        )
+        duration = time.perf_counter_ns() - start_time
+
+        if duration >= self.slow_request_time:
+            level = 'WARNING'
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            level = 'DEBUG'
+        else:
+            return
 
-        return response
+        logger.opt(lazy=True).log(
+            level,
+            'Запрос к api. {}. Response({}). Время исполнения: {} мс',
+            lambda: self.__format_request(scope),
+            lambda: status_code,
+            lambda: duration // 1_000_000
+        )
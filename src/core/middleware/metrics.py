@@ -0,0 +1,33 @@
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.methods.metrics import QueryStats, query_stats
+from core.objects.metrics import request_duration, request_queries, request_query_duration
+
+
+class MetricsMiddleware:
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_stats.reset(token)
+
+            route = scope['route'].path if 'route' in scope else 'unmatched'
+
+            request_duration.observe(time.perf_counter() - start_time, scope['method'], route)
+            request_queries.observe(stats.count, route)
+            request_query_duration.observe(stats.time, route)
@@ -15,6 +15,7 @@ class Balance(Base):
     user_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), ForeignKey(User.id, ondelete="CASCADE"))
     ticker: Mapped[str] = column(Text, ForeignKey(Instrument.ticker, ondelete="CASCADE"), nullable=False)
     amount: Mapped[int] = column(Integer, nullable=False, server_default=text("0"))
+    reserved: Mapped[int] = column(Integer, nullable=False, server_default=text("0"))
 
     # noinspection PyTypeChecker
     __table_args__ = (
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from everbase import Base
+from sqlalchemy import BigInteger, ForeignKey, Integer, Text, TIMESTAMP, PrimaryKeyConstraint
+from sqlalchemy.orm import mapped_column as column, MappedColumn as Mapped
+
+from core.models.instrument import Instrument
+
+
+class Candle(Base):
+    __tablename__ = "candles"
+
+    ticker: Mapped[str] = column(Text, ForeignKey(Instrument.ticker, ondelete="CASCADE"), nullable=False)
+    interval: Mapped[str] = column(Text, nullable=False)
+    bucket: Mapped[datetime] = column(TIMESTAMP(timezone=True), nullable=False)
+
+    open: Mapped[int] = column(Integer, nullable=False)
+    high: Mapped[int] = column(Integer, nullable=False)
+    low: Mapped[int] = column(Integer, nullable=False)
+    close: Mapped[int] = column(Integer, nullable=False)
+    volume: Mapped[int] = column(BigInteger, nullable=False)
+
+    # noinspection PyTypeChecker
+    __table_args__ = (
+        PrimaryKeyConstraint(ticker, interval, bucket, name='candles_pk'),
+    )
@@ -0,0 +1,12 @@
+from everbase import Base
+from sqlalchemy import BigInteger, ForeignKey, Text, text
+from sqlalchemy.orm import mapped_column as column, MappedColumn as Mapped
+
+from core.models.instrument import Instrument
+
+
+class EngineState(Base):
+    __tablename__ = "engine_state"
+
+    ticker: Mapped[str] = column(Text, ForeignKey(Instrument.ticker, ondelete="CASCADE"), primary_key=True)
+    seq: Mapped[int] = column(BigInteger, nullable=False, server_default=text("0"))
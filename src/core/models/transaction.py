@@ -7,7 +7,6 @@ from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import mapped_column as column, MappedColumn as Mapped
 
 from core.models.instrument import Instrument
-from core.models.order import Order
 from core.models.user import User
 
 
@@ -23,7 +22,9 @@ class Transaction(Base):
     buyer_user_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), ForeignKey(User.id, ondelete="CASCADE"), nullable=False)
     seller_user_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), ForeignKey(User.id, ondelete="CASCADE"), nullable=False)
 
-    buyer_order_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), ForeignKey(Order.id, ondelete="CASCADE"), nullable=False)
-    seller_order_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), ForeignKey(Order.id, ondelete="CASCADE"), nullable=False)
+    buyer_order_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), nullable=False)
+    seller_order_id: Mapped[uuid.UUID] = column(UUID(as_uuid=True), nullable=False)
 
-    timestamp: Mapped[datetime] = column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    timestamp: Mapped[datetime] = column(
+        TIMESTAMP(timezone=True), primary_key=True, nullable=False, server_default=text("now()")
+    )
@@ -0,0 +1,3 @@
+from modules.candles.rollup import Candles
+
+candles = Candles()
@@ -0,0 +1,3 @@
+from core.methods.clock import Clock
+
+clock = Clock()
@@ -1,5 +1,5 @@
-from everbase import DatabasePool
-
 from core.config.settings import settings
+from core.methods.pool import ConnectionPool
 
-database = DatabasePool(settings.database, pool_size=1)
+database = ConnectionPool('write', settings.database, settings.database.pool)
+read_database = ConnectionPool('read', settings.database, settings.database.read_pool)
@@ -0,0 +1,3 @@
+from modules.instruments.registry import Instruments
+
+instruments = Instruments()
@@ -0,0 +1,8 @@
+from core.config.settings import settings
+from modules.orders.journal import Journal
+
+journal = Journal(
+    is_enabled=settings.journal.is_enabled,
+    directory=settings.journal.directory,
+    segment_size=settings.journal.segment_size
+)
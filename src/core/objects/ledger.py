@@ -0,0 +1,3 @@
+from modules.orders.ledger import Ledger
+
+ledger = Ledger()
@@ -0,0 +1,36 @@
+from core.methods.metrics import Registry, Histogram, Gauge, Counter
+
+metrics = Registry()
+
+request_duration = metrics.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ('method', 'route')
+))
+
+request_queries = metrics.register(Histogram(
+    'http_request_db_queries', 'Количество обращений к базе данных за запрос', ('route',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+))
+
+request_query_duration = metrics.register(Histogram(
+    'http_request_db_duration_seconds', 'Время обращений к базе данных за запрос', ('route',)
+))
+
+pool_acquire_duration = metrics.register(Histogram(
+    'db_pool_acquire_seconds', 'Время ожидания соединения из пула', ('pool',),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+))
+
+pool_size = metrics.register(Gauge('db_pool_size', 'Количество соединений в пуле', ('pool', 'state')))
+
+cache_requests = metrics.register(Counter('cache_requests_total', 'Обращения к кешу', ('cache', 'result')))
+
+cache_size = metrics.register(Gauge('cache_size', 'Количество записей в кеше', ('cache',)))
+
+order_stage_duration = metrics.register(Histogram(
+    'order_stage_duration_seconds', 'Время этапов исполнения ордера', ('stage',),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+))
+
+order_fills = metrics.register(Histogram(
+    'order_fills', 'Количество сделок на один ордер', buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+))
@@ -0,0 +1,4 @@
+from core.objects.journal import journal
+from modules.orders.book import OrderBooks
+
+order_books = OrderBooks(journal)
@@ -0,0 +1,3 @@
+from core.methods.sequencer import Sequencer
+
+sequencer = Sequencer()
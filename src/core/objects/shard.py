@@ -0,0 +1,4 @@
+from core.config.settings import settings
+from core.methods.sharding import Shard
+
+shard = Shard(workers=settings.server.workers, socket_dir=settings.server.socket_dir)
@@ -0,0 +1,3 @@
+from core.methods.statements import Statements
+
+statements = Statements()
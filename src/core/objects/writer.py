@@ -0,0 +1,9 @@
+from core.config.settings import settings
+from modules.orders.writer import Writer
+
+writer = Writer(
+    is_enabled=settings.persistence.is_async,
+    flush_interval=settings.persistence.flush_interval,
+    flush_size=settings.persistence.flush_size,
+    max_pending=settings.persistence.max_pending
+)
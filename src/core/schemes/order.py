@@ -11,3 +11,9 @@ class OrderStatus(StrEnum):
     EXECUTED = "EXECUTED"
     PARTIALLY_EXECUTED = "PARTIALLY_EXECUTED"
     CANCELLED = "CANCELLED"
+
+
+class Durability(StrEnum):
+    PENDING = "PENDING"
+    DURABLE = "DURABLE"
+    FAILED = "FAILED"
@@ -1,8 +1,76 @@
-from everbase import DatabaseSettings
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class PoolSettings(BaseModel):
+    min_size: int = 1
+    max_size: int = 10
+    acquire_timeout: float = 10
+    statement_cache_size: int = 100
+
+
+class DatabaseSettings(BaseModel):
+    user: str
+    password: str
+    host: str
+    name: str
+    port: int = 5432
+    copy_threshold: int = 500
+
+    pool: PoolSettings = PoolSettings()
+    read_pool: PoolSettings = PoolSettings(max_size=5)
+
+
+class AuthenticationSettings(BaseModel):
+    cache_size: int = 100_000
+    cache_ttl: float = 60
+    negative_cache_ttl: float = 5
+
+
+class InstrumentsSettings(BaseModel):
+    listen: bool = False
+
+
+class ServerSettings(BaseModel):
+    workers: int = 1
+    socket_dir: str = '/tmp/tochka-api'
+
+
+class PersistenceSettings(BaseModel):
+    is_async: bool = False
+    flush_interval: float = 0.005
+    flush_size: int = 256
+    max_pending: int = 10_000
+
+
+class JournalSettings(BaseModel):
+    is_enabled: bool = False
+    directory: str = '/root/memory/journal'
+    segment_size: int = 64 * 1024 * 1024
+
+
+class ArchiveSettings(BaseModel):
+    partitions_ahead: int = 3
+    maintenance_interval: float = 3600
+    orders_retention: int = 30
+    retention: int = 365
+    batch_size: int = 10_000
+    directory: str | None = None
+
+
+class LoggingSettings(BaseModel):
+    sample_rate: float = 1
+    slow_request_time: float = 1
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file='.env', extra='ignore', env_nested_delimiter='__')
 
     database: DatabaseSettings
+    authentication: AuthenticationSettings = AuthenticationSettings()
+    instruments: InstrumentsSettings = InstrumentsSettings()
+    server: ServerSettings = ServerSettings()
+    persistence: PersistenceSettings = PersistenceSettings()
+    journal: JournalSettings = JournalSettings()
+    archive: ArchiveSettings = ArchiveSettings()
+    logging: LoggingSettings = LoggingSettings()
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
+from modules.candles.api import router as candles_router
 from modules.instruments.api import router as instruments_router
+from modules.metrics.api import router as metrics_router
 from modules.orders.api import router as orders_router
 from modules.transactions.api import router as transactions_router
 from modules.users.api import router as users_router
@@ -10,3 +12,7 @@ v1_router.include_router(users_router)
 v1_router.include_router(instruments_router)
 v1_router.include_router(orders_router)
 v1_router.include_router(transactions_router)
+v1_router.include_router(candles_router)
+
+root_router = APIRouter()
+root_router.include_router(metrics_router)
@@ -5,9 +5,11 @@ from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR, HTTP_422_UNPROCESSABLE_ENTITY
 
+from core.config.settings import settings
 from core.methods.lifespan import Lifespan
 from core.middleware.logger import LoggerMiddleware
-from general.routers import v1_router
+from core.middleware.metrics import MetricsMiddleware
+from general.routers import v1_router, root_router
 
 app = FastAPI(
     title='Tochka API',
@@ -19,7 +21,14 @@ app = FastAPI(
 )
 
 # noinspection PyTypeChecker
-app.add_middleware(LoggerMiddleware)
+app.add_middleware(
+    LoggerMiddleware,
+    sample_rate=settings.logging.sample_rate,
+    slow_request_time=settings.logging.slow_request_time
+)
+
+# noinspection PyTypeChecker
+app.add_middleware(MetricsMiddleware)
 
 # noinspection PyTypeChecker
 app.add_middleware(
@@ -34,6 +43,7 @@ api_router = APIRouter(prefix='/api')
 api_router.include_router(v1_router)
 
 app.include_router(api_router)
+app.include_router(root_router)
 
 
 @app.exception_handler(Exception)
@@ -49,4 +59,4 @@ def validation_exception_handler(_: Request, __: RequestValidationError):
 if __name__ == '__main__':
     import uvicorn
 
-    uvicorn.run('main:app', workers=1, host='0.0.0.0', timeout_keep_alive=600, forwarded_allow_ips="172.19.0.3")
+    uvicorn.run('main:app', workers=settings.server.workers, host='0.0.0.0', timeout_keep_alive=600, forwarded_allow_ips="172.19.0.3")
@@ -0,0 +1,104 @@
+import gzip
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from asyncpg import Connection
+
+CREATE_PARTITIONS = "SELECT create_partitions($1, $2, $3)"
+
+SELECT_PARTITIONS = """
+    SELECT c.relname AS name FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = $1::regclass
+    ORDER BY c.relname
+"""
+
+SELECT_ARCHIVABLE_SINCE = """
+    SELECT min(timestamp) FROM orders
+    WHERE status IN ('EXECUTED', 'CANCELLED') AND timestamp < $1
+"""
+
+ARCHIVE_ORDERS = """
+    WITH archived AS (
+        DELETE FROM orders WHERE id IN (
+            SELECT id FROM orders
+            WHERE status IN ('EXECUTED', 'CANCELLED') AND timestamp < $1
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, ticker, direction, status, qty, filled, price, timestamp
+    )
+    INSERT INTO orders_archive (id, user_id, ticker, direction, status, qty, filled, price, timestamp)
+    SELECT id, user_id, ticker, direction, status, qty, filled, price, timestamp FROM archived
+"""
+
+PARTITIONED_TABLES = ('transactions', 'orders_archive')
+
+
+async def create_partitions(connection: Connection, table: str, since: datetime | None, ahead: int) -> int:
+    return await connection.fetchval(CREATE_PARTITIONS, table, since or datetime.now(timezone.utc), ahead)
+
+
+def upper_bound(table: str, partition: str) -> datetime | None:
+    match = re.fullmatch(rf'{table}_(\d{{4}})(\d{{2}})', partition)
+
+    if match is None:
+        return None
+
+    year, month = int(match[1]), int(match[2])
+
+    return datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+async def expired_partitions(connection: Connection, table: str, before: datetime) -> list[str]:
+    return [
+        record['name']
+        for record in await connection.fetch(SELECT_PARTITIONS, table)
+        if (bound := upper_bound(table, record['name'])) is not None and bound <= before
+    ]
+
+
+async def archive_orders(connection: Connection, before: datetime, batch_size: int) -> int:
+    since = await connection.fetchval(SELECT_ARCHIVABLE_SINCE, before)
+
+    if since is None:
+        return 0
+
+    await create_partitions(connection, 'orders_archive', since, 0)
+
+    archived = 0
+
+    while True:
+        count = int((await connection.execute(ARCHIVE_ORDERS, before, batch_size)).split()[-1])
+        archived += count
+
+        if count < batch_size:
+            return archived
+
+
+async def detach_partition(connection: Connection, table: str, partition: str) -> str:
+    detached = f'{partition}_{datetime.now(timezone.utc):%Y%m%d%H%M%S}'
+
+    async with connection.transaction():
+        await connection.execute(f'ALTER TABLE {table} DETACH PARTITION {partition}')
+        await connection.execute(f'ALTER TABLE {partition} RENAME TO {detached}')
+
+    return detached
+
+
+async def export_partition(connection: Connection, partition: str, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, f'{partition}.csv.gz')
+
+    with gzip.open(path, 'wb') as file:
+        await connection.copy_from_table(partition, output=file, format='csv', header=True)
+
+    await connection.execute(f'DROP TABLE {partition}')
+
+    return path
+
+
+def cutoff(days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
@@ -0,0 +1,22 @@
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import Response
+
+from core.objects.instruments import instruments
+from modules.candles.methods import get_candles
+from modules.candles.rollup import Candles
+
+router = APIRouter()
+
+
+@router.get('/public/candles/{ticker}')
+async def get_ticker_candles(
+    ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
+    interval: Annotated[Literal['1m', '5m', '1h', '1d'], Query()] = '1m',
+    limit: Annotated[int, Query(ge=1, le=Candles.CACHE_SIZE)] = 100
+):
+    if ticker not in instruments:
+        raise HTTPException(status_code=404, detail="Инструмент не найден")
+
+    return Response(content=await get_candles(ticker, interval, limit), media_type='application/json')
@@ -0,0 +1,30 @@
+from core.objects.candles import candles
+from core.objects.database import database
+from core.objects.sequencer import sequencer
+from core.objects.shard import shard
+from core.objects.writer import writer
+
+
+async def load_candles(ticker: str, interval: str) -> None:
+    if writer.is_enabled:
+        await writer.barrier()
+
+    async with database.get_connection() as connection:
+        await candles.load(connection, ticker, interval)
+
+
+async def get_candles(ticker: str, interval: str, limit: int) -> bytes:
+    if not shard.is_local(ticker):
+        return (await shard.call(
+            ticker, 'candles', {'ticker': ticker, 'interval': interval, 'limit': limit}
+        )).encode()
+
+    if not candles.is_loaded(ticker, interval):
+        await sequencer.submit(ticker, load_candles, ticker, interval)
+
+    return candles.encoded(ticker, interval, limit)
+
+
+@shard.procedure('candles')
+async def handle_candles(params: dict) -> str:
+    return (await get_candles(params['ticker'], params['interval'], params['limit'])).decode()
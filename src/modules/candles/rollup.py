@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+
+import orjson
+from asyncpg import Connection
+
+INTERVALS = {'1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+
+SELECT_CANDLES = """
+    SELECT bucket, open, high, low, close, volume FROM candles
+    WHERE ticker = $1 AND interval = $2
+    ORDER BY bucket DESC
+    LIMIT $3
+"""
+
+UPSERT_CANDLES = """
+    INSERT INTO candles (ticker, interval, bucket, open, high, low, close, volume)
+    SELECT $1::text, * FROM unnest(
+        $2::text[], $3::timestamptz[], $4::integer[], $5::integer[], $6::integer[], $7::integer[], $8::bigint[]
+    )
+    ON CONFLICT (ticker, interval, bucket) DO UPDATE
+    SET high = greatest(candles.high, excluded.high),
+        low = least(candles.low, excluded.low),
+        close = excluded.close,
+        volume = candles.volume + excluded.volume
+"""
+
+
+def floor(timestamp: datetime, seconds: int) -> datetime:
+    return datetime.fromtimestamp(int(timestamp.timestamp()) // seconds * seconds, timezone.utc)
+
+
+def aggregate(trades: list[tuple[datetime, int, int]]) -> dict[tuple[str, datetime], list[int]]:
+    candles: dict[tuple[str, datetime], list[int]] = {}
+
+    for timestamp, price, qty in trades:
+        for interval, seconds in INTERVALS.items():
+            key = (interval, floor(timestamp, seconds))
+            candle = candles.get(key)
+
+            if candle is None:
+                candles[key] = [price, price, price, price, qty]
+                continue
+
+            candle[1] = max(candle[1], price)
+            candle[2] = min(candle[2], price)
+            candle[3] = price
+            candle[4] += qty
+
+    return candles
+
+
+async def write_candles(connection: Connection, ticker: str, candles: dict[tuple[str, datetime], list[int]]) -> None:
+    await connection.execute(
+        UPSERT_CANDLES,
+        ticker,
+        [key[0] for key in candles],
+        [key[1] for key in candles],
+        *map(list, zip(*candles.values()))
+    )
+
+
+def encode(bucket: datetime, candle: list[int]) -> dict:
+    return {
+        'timestamp': bucket,
+        'open': candle[0],
+        'high': candle[1],
+        'low': candle[2],
+        'close': candle[3],
+        'volume': candle[4]
+    }
+
+
+class Candles:
+    CACHE_SIZE = 1000
+
+    def __init__(self):
+        self.__series: dict[tuple[str, str], dict[datetime, list[int]]] = {}
+
+    def is_loaded(self, ticker: str, interval: str) -> bool:
+        return (ticker, interval) in self.__series
+
+    async def load(self, connection: Connection, ticker: str, interval: str) -> None:
+        if (ticker, interval) in self.__series:
+            return
+
+        records = await connection.fetch(SELECT_CANDLES, ticker, interval, self.CACHE_SIZE)
+
+        self.__series[(ticker, interval)] = {
+            record['bucket']: [record['open'], record['high'], record['low'], record['close'], record['volume']]
+            for record in reversed(records)
+        }
+
+    def update(self, ticker: str, candles: dict[tuple[str, datetime], list[int]]) -> None:
+        for (interval, bucket), candle in candles.items():
+            series = self.__series.get((ticker, interval))
+
+            if series is None:
+                continue
+
+            current = series.get(bucket)
+
+            if current is not None:
+                current[1] = max(current[1], candle[1])
+                current[2] = min(current[2], candle[2])
+                current[3] = candle[3]
+                current[4] += candle[4]
+                continue
+
+            is_ordered = not series or bucket > next(reversed(series))
+            series[bucket] = list(candle)
+
+            if not is_ordered:
+                self.__series[(ticker, interval)] = series = dict(sorted(series.items()))
+
+            if len(series) > self.CACHE_SIZE:
+                del series[next(iter(series))]
+
+    def encoded(self, ticker: str, interval: str, limit: int) -> bytes:
+        series = self.__series[(ticker, interval)]
+        buckets = list(series.items())[-limit:]
+
+        return orjson.dumps([encode(bucket, candle) for bucket, candle in buckets])
+
+    def drop(self, ticker: str) -> None:
+        for key in [key for key in self.__series if key[0] == ticker]:
+            del self.__series[key]
@@ -1,47 +1,57 @@
 from typing import Annotated
 
-from everbase import Insert, Select, Delete
+from everbase import Insert, Delete
 from fastapi import APIRouter, Body, Depends, Path, HTTPException
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy import true
 
+from core.config.settings import settings
 from core.methods.authentication import Authentication
 from core.models.instrument import Instrument
 from core.objects.database import database
+from core.objects.instruments import instruments
+from core.objects.ledger import ledger
+from core.objects.shard import shard
+from core.objects.writer import writer
 from core.schemes.user import UserRole
 from modules.instruments.schemes import InstrumentModel
+from modules.orders.dispatch import submit_drop_instrument
+from modules.orders.methods import release_ticker_orders
 from modules.users.schemes import UserModel
 
 router = APIRouter()
 
+NOTIFY_INSTRUMENTS = "SELECT pg_notify('instruments', $1)"
+
 
 @router.post('/admin/instrument')
 async def create_instrument(
     instrument: Annotated[InstrumentModel, Body()],
     _: Annotated[UserModel, Depends(Authentication(user_role=UserRole.ADMIN))]
 ):
-    response = await (
-        Insert(Instrument)
-        .values(ticker=instrument.ticker, name=instrument.name)
-        .on_conflict_do_nothing()
-        .returning(true())
-        .fetch_all(database)
-    )
+    async with database.get_connection() as connection:
+        response = await (
+            Insert(Instrument)
+            .values(ticker=instrument.ticker, name=instrument.name)
+            .on_conflict_do_nothing()
+            .returning(true())
+            .fetch_all(connection)
+        )
+
+        if response and (settings.instruments.listen or shard.is_enabled):
+            await connection.execute(NOTIFY_INSTRUMENTS, instrument.ticker)
 
     if not response:
         raise HTTPException(status_code=409, detail="Инструмент уже существует")
 
+    instruments.add(instrument.ticker, instrument.name)
+
     return ORJSONResponse(content={"success": True})
 
 
 @router.get('/public/instrument')
 async def get_instruments():
-    response = await (
-        Select(Instrument.ticker, Instrument.name)
-        .fetch_all(database, model=lambda x: InstrumentModel(**x).model_dump())
-    )
-
-    return ORJSONResponse(content=response)
+    return Response(content=instruments.encoded(), media_type='application/json')
 
 
 @router.delete('/admin/instrument/{ticker}')
@@ -49,14 +59,29 @@ async def delete_instrument(
     ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
     _: Annotated[UserModel, Depends(Authentication(user_role=UserRole.ADMIN))]
 ):
-    response = await (
-        Delete(Instrument)
-        .where(Instrument.ticker == ticker)
-        .returning(true())
-        .fetch_all(database)
-    )
+    if writer.is_enabled:
+        await writer.barrier()
+
+    async with database.get_connection() as connection, connection.transaction():
+        released = await release_ticker_orders(connection, ticker)
+
+        response = await (
+            Delete(Instrument)
+            .where(Instrument.ticker == ticker)
+            .returning(true())
+            .fetch_all(connection)
+        )
+
+        if response and (settings.instruments.listen or shard.is_enabled):
+            await connection.execute(NOTIFY_INSTRUMENTS, ticker)
 
     if not response:
         raise HTTPException(status_code=404, detail="Инструмент не найден")
 
+    if writer.is_enabled:
+        ledger.apply(released)
+
+    instruments.remove(ticker)
+    await submit_drop_instrument(ticker)
+
     return ORJSONResponse(content={"success": True})
@@ -0,0 +1,47 @@
+import orjson
+from asyncpg import Connection
+from everbase import Select
+
+from core.models.instrument import Instrument
+
+
+class Instruments:
+
+    def __init__(self):
+        self.__instruments: dict[str, str] = {}
+        self.__encoded: bytes | None = None
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.__instruments
+
+    def __iter__(self):
+        return iter(self.__instruments)
+
+    def add(self, ticker: str, name: str) -> None:
+        self.__instruments[ticker] = name
+        self.__encoded = None
+
+    def remove(self, ticker: str) -> None:
+        self.__instruments.pop(ticker, None)
+        self.__encoded = None
+
+    def encoded(self) -> bytes:
+        if self.__encoded is None:
+            self.__encoded = orjson.dumps(
+                [{'name': name, 'ticker': ticker} for ticker, name in self.__instruments.items()]
+            )
+
+        return self.__encoded
+
+    async def load(self, connection: Connection) -> set[str]:
+        response = await (
+            Select(Instrument.ticker, Instrument.name)
+            .fetch_all(connection)
+        )
+
+        removed = set(self.__instruments)
+
+        self.__instruments = {instrument['ticker']: instrument['name'] for instrument in response}
+        self.__encoded = None
+
+        return removed - set(self.__instruments)
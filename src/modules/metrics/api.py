@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from core.methods.authentication import Authentication
+from core.methods.metrics import merge
+from core.objects.database import database, read_database
+from core.objects.metrics import metrics
+from core.objects.shard import shard
+
+router = APIRouter()
+
+
+def collect() -> bytes:
+    database.collect()
+    read_database.collect()
+    Authentication.cache.collect()
+
+    return metrics.render()
+
+
+@shard.procedure('metrics')
+async def handle_metrics(_: dict) -> str:
+    return collect().decode()
+
+
+@router.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    content = collect()
+
+    if shard.is_enabled:
+        content = merge([content, *(exposition.encode() for exposition in await shard.broadcast('metrics', {}))])
+
+    return Response(content=content, media_type='text/plain; version=0.0.4')
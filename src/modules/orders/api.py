@@ -1,133 +1,201 @@
+import asyncio
+from collections import defaultdict
+from contextlib import aclosing
 from typing import Annotated
 
-from asyncpg import Record
-from everbase import Select, Insert, Update
-from fastapi import APIRouter, Depends, HTTPException, Body, Path, Query
-from fastapi.responses import ORJSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Body, Path, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import UUID4
-from sqlalchemy import true, func
+from starlette.status import WS_1008_POLICY_VIOLATION, WS_1013_TRY_AGAIN_LATER
 
 from core.methods.authentication import Authentication
-from core.models.balance import Balance
-from core.models.instrument import Instrument
-from core.models.order import Order
 from core.objects.database import database
-from core.schemes.order import Direction, OrderStatus
+from core.objects.instruments import instruments
+from core.objects.statements import statements
+from core.objects.writer import writer
+from core.schemes.order import Durability, OrderStatus
 from core.schemes.user import UserRole
-from modules.orders.methods import execute_order
-from modules.orders.schemes import LimitOrderBody, MarketOrderBody, LimitOrderModel, MarketOrderModel, OrderBook, Level, \
-    OrderModel
+from modules.orders.dispatch import (
+    submit_order, submit_orders, submit_amend, submit_cancel, submit_cancels, submit_cancel_all,
+    get_snapshot, stream_book
+)
+from modules.orders.engine import is_crossing
+from modules.orders.methods import iter_user_orders, dump_order
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody, AmendOrderBody
 from modules.users.schemes import UserModel
 
 router = APIRouter()
 
+MAX_BATCH_SIZE = 100
+
+SELECT_ORDER = statements.register(
+    'select_order',
+    """
+    SELECT id, status, user_id, timestamp, ticker, direction, qty, price, filled FROM orders
+    WHERE user_id = $1 AND id = $2
+    UNION ALL
+    SELECT id, status, user_id, timestamp, ticker, direction, qty, price, filled FROM orders_archive
+    WHERE user_id = $1 AND id = $2
+    LIMIT 1
+    """
+)
+
+SELECT_ORDER_EXISTS = statements.register(
+    'select_order_exists',
+    """
+    SELECT true FROM orders WHERE user_id = $1 AND id = $2
+    UNION ALL
+    SELECT true FROM orders_archive WHERE user_id = $1 AND id = $2
+    LIMIT 1
+    """
+)
+
+SELECT_ORDER_KEY = statements.register(
+    'select_order_key',
+    """
+    SELECT timestamp, id FROM orders WHERE user_id = $1 AND id = $2
+    UNION ALL
+    SELECT timestamp, id FROM orders_archive WHERE user_id = $1 AND id = $2
+    LIMIT 1
+    """
+)
+
+SELECT_ACTIVE_ORDER = statements.register(
+    'select_active_order',
+    "SELECT ticker FROM orders "
+    "WHERE ($1::uuid IS NULL OR user_id = $1) AND id = $2 AND status IN ('NEW', 'PARTIALLY_EXECUTED')"
+)
+
+SELECT_ACTIVE_ORDERS = statements.register(
+    'select_active_orders',
+    "SELECT id, ticker FROM orders "
+    "WHERE ($1::uuid IS NULL OR user_id = $1) AND id = ANY($2::uuid[]) AND status IN ('NEW', 'PARTIALLY_EXECUTED')"
+)
+
+SELECT_AMENDABLE_ORDER = statements.register(
+    'select_amendable_order',
+    "SELECT ticker FROM orders "
+    "WHERE user_id = $1 AND id = $2 AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL"
+)
+
 
 @router.post("/order")
 async def create_order(
     order: Annotated[LimitOrderBody | MarketOrderBody, Body()],
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))],
+    durable: Annotated[bool, Query()] = False
+):
+    order_id = await submit_order(user.id, order)
+
+    if durable:
+        return ORJSONResponse(content={"success": True, 'order_id': order_id, 'durable': await writer.wait(order_id)})
+
+    return ORJSONResponse(content={"success": True, 'order_id': order_id})
+
+
+@router.post("/order/batch")
+async def create_orders(
+    orders: Annotated[list[LimitOrderBody | MarketOrderBody], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
+):
+    groups: dict[str, list[int]] = defaultdict(list)
+
+    for index, order in enumerate(orders):
+        groups[order.ticker].append(index)
+
+    if any(is_crossing([orders[index] for index in indexes]) for indexes in groups.values()):
+        raise HTTPException(status_code=422, detail="Ордера в пакете пересекаются")
+
+    responses = await asyncio.gather(
+        *(submit_orders(user.id, ticker, [orders[index] for index in indexes]) for ticker, indexes in groups.items()),
+        return_exceptions=True
+    )
+
+    results: list[dict | None] = [None] * len(orders)
+
+    for indexes, response in zip(groups.values(), responses):
+        if isinstance(response, HTTPException):
+            response = [{'success': False, 'detail': response.detail}] * len(indexes)
+        elif isinstance(response, BaseException):
+            raise response
+
+        for index, result in zip(indexes, response):
+            results[index] = result
+
+    return ORJSONResponse(content=results)
+
+
+@router.delete("/order/batch")
+async def cancel_orders(
+    order_ids: Annotated[list[UUID4], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
     user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
 ):
+    await writer.wait(*order_ids)
+
     async with database.get_connection() as connection:
-        is_instrument_exist = await (
-            Select(true())
-            .select_from(Instrument)
-            .where(Instrument.ticker == order.ticker)
-            .fetch_one(connection)
+        orders = await connection.fetch_statement(
+            SELECT_ACTIVE_ORDERS, user.id if user.role == UserRole.USER else None, order_ids
         )
 
-        if is_instrument_exist is None:
-            raise HTTPException(status_code=404, detail="Инструмент не найден")
-
-        if order.direction == Direction.SELL:
-            balance = await (
-                Select(Balance.amount)
-                .where(Balance.user_id == user.id, Balance.ticker == order.ticker)
-                .fetch_one(connection)
-            )
-
-            if balance is None:
-                raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-            order_balance: Record = await (
-                Select(func.sum(Order.qty - Order.filled).label('amount'))
-                .where(
-                    Order.direction == Direction.SELL,
-                    Order.user_id == user.id,
-                    Order.ticker == order.ticker,
-                    Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED])
-                )
-                .fetch_one(connection)
-            )
-
-            available = balance['amount'] - (order_balance['amount'] or 0)
-            if available < order.qty:
-                raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-        else:
-            balance = await (
-                Select(Balance.amount)
-                .where(Balance.user_id == user.id, Balance.ticker == 'RUB')
-                .fetch_one(connection)
-            )
-
-            if balance is None:
-                raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-            order_balance: Record = await (
-                Select(func.sum((Order.qty - Order.filled) * Order.price).label('amount'))
-                .where(
-                    Order.direction == Direction.BUY,
-                    Order.user_id == user.id,
-                    Order.price.is_not(None),
-                    Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED])
-                )
-                .fetch_one(connection)
-            )
-
-            available = balance['amount'] - (order_balance['amount'] or 0)
-            if available < order.qty * (order.price if isinstance(order, LimitOrderBody) else 1):
-                raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-        orders = await (
-            Insert(Order)
-            .values(
-                user_id=user.id,
-                ticker=order.ticker,
-                qty=order.qty,
-                price=(order.price if isinstance(order, LimitOrderBody) else None),
-                direction=order.direction
-            )
-            .returning(
-                Order.id, Order.user_id, Order.price, Order.qty,
-                Order.filled, Order.status, Order.direction, Order.ticker
-            )
-            .fetch_one(connection, model=lambda x: (OrderModel(**x), x['direction'], x['ticker']))
-        )
+    groups: dict[str, list[UUID4]] = defaultdict(list)
+
+    for order in orders:
+        groups[order['ticker']].append(order['id'])
+
+    responses = await asyncio.gather(
+        *(submit_cancels(ticker, ids) for ticker, ids in groups.items()),
+        return_exceptions=True
+    )
+
+    cancelled = set()
+
+    for response in responses:
+        if isinstance(response, HTTPException):
+            continue
+
+        if isinstance(response, BaseException):
+            raise response
+
+        cancelled.update(response)
 
-        await execute_order(connection, orders[0], orders[1], orders[2])
+    return ORJSONResponse(content=[{'order_id': order_id, 'success': order_id in cancelled} for order_id in order_ids])
 
-    return ORJSONResponse(content={"success": True, 'order_id': orders[0].id})
+
+@router.delete("/order/ticker/{ticker}")
+async def cancel_ticker_orders(
+    ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
+):
+    if ticker not in instruments:
+        raise HTTPException(status_code=404, detail="Инструмент не найден")
+
+    order_ids = await submit_cancel_all(ticker, user.id)
+
+    return ORJSONResponse(content={"success": True, 'order_ids': order_ids})
 
 
 @router.get("/order")
 async def get_user_orders(
-    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))],
+    status: Annotated[list[OrderStatus] | None, Query()] = None,
+    after: Annotated[UUID4 | None, Query()] = None,
+    limit: Annotated[int | None, Query(ge=1)] = None
 ):
-    response = await (
-        Select(Order)
-        .where(Order.user_id == user.id)
-        .fetch_all(database)
-    )
+    cursor = None
+
+    if after is not None:
+        await writer.wait(after)
 
-    result = []
+        async with database.get_connection() as connection:
+            cursor = await connection.fetchrow_statement(SELECT_ORDER_KEY, user.id, after)
 
-    for order in response:
-        if order['price'] is not None:
-            result.append(LimitOrderModel(**order, body=LimitOrderBody(**order)).model_dump())
-        else:
-            result.append(MarketOrderModel(**order, body=MarketOrderBody(**order)).model_dump())
+        if cursor is None:
+            raise HTTPException(status_code=404, detail="Ордер не найден")
 
-    return ORJSONResponse(content=result)
+    return StreamingResponse(
+        content=iter_user_orders(user.id, status, cursor, limit),
+        media_type='application/json'
+    )
 
 
 @router.get("/order/{order_id}")
@@ -135,19 +203,56 @@ async def get_order(
     order_id: Annotated[UUID4, Path()],
     user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
 ):
-    response = await (
-        Select(Order)
-        .where(Order.user_id == user.id, Order.id == order_id)
-        .fetch_one(database)
-    )
+    await writer.wait(order_id)
+
+    async with database.get_connection() as connection:
+        response = await connection.fetchrow_statement(SELECT_ORDER, user.id, order_id)
 
     if response is None:
         raise HTTPException(status_code=404, detail="Ордер не найден")
 
-    if response['price'] is not None:
-        return ORJSONResponse(content=LimitOrderModel(**response, body=LimitOrderBody(**response)).model_dump())
+    return Response(content=dump_order(response), media_type='application/json')
+
+
+@router.get("/order/{order_id}/durability")
+async def get_order_durability(
+    order_id: Annotated[UUID4, Path()],
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
+):
+    status = writer.status(order_id, user.id)
+
+    if status is None:
+        async with database.get_connection() as connection:
+            is_order_exist = await connection.fetchval_statement(SELECT_ORDER_EXISTS, user.id, order_id)
+
+        if is_order_exist is None:
+            raise HTTPException(status_code=404, detail="Ордер не найден")
+
+        status = Durability.DURABLE
+
+    return ORJSONResponse(content={'order_id': order_id, 'status': status})
+
+
+@router.patch("/order/{order_id}")
+async def amend_order(
+    order_id: Annotated[UUID4, Path()],
+    amend: Annotated[AmendOrderBody, Body()],
+    user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
+):
+    if amend.price is None and amend.qty is None:
+        raise HTTPException(status_code=422, detail="Необрабатываемая сущность")
+
+    await writer.wait(order_id)
+
+    async with database.get_connection() as connection:
+        order = await connection.fetchrow_statement(SELECT_AMENDABLE_ORDER, user.id, order_id)
+
+    if order is None:
+        raise HTTPException(status_code=409, detail="Ордер нельзя изменить")
+
+    new_order_id = await submit_amend(order['ticker'], user.id, order_id, amend.price, amend.qty)
 
-    return ORJSONResponse(content=MarketOrderModel(**response, body=MarketOrderBody(**response)).model_dump())
+    return ORJSONResponse(content={"success": True, 'order_id': new_order_id})
 
 
 @router.delete("/order/{order_id}")
@@ -155,26 +260,15 @@ async def cancel_order(
     order_id: Annotated[UUID4, Path()],
     user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]
 ):
+    await writer.wait(order_id)
+
     async with database.get_connection() as connection:
-        order = await (
-            Select(true())
-            .where(
-                ((Order.user_id == user.id) if user.role == UserRole.USER else True),
-                Order.id == order_id,
-                Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED])
-            )
-            .fetch_one(connection)
+        order = await connection.fetchrow_statement(
+            SELECT_ACTIVE_ORDER, user.id if user.role == UserRole.USER else None, order_id
         )
 
-        if order is None:
-            raise HTTPException(status_code=409, detail="Ордер нельзя отменить")
-
-        await (
-            Update(Order)
-            .where(Order.id == order_id)
-            .values(status=OrderStatus.CANCELLED)
-            .fetch_one(connection)
-        )
+    if order is None or not await submit_cancel(order['ticker'], order_id):
+        raise HTTPException(status_code=409, detail="Ордер нельзя отменить")
 
     return ORJSONResponse(content={"success": True})
 
@@ -184,47 +278,31 @@ async def get_order_book(
     ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
     limit: Annotated[int, Query()] = 10
 ):
-    is_instrument_exist = await (
-        Select(true())
-        .select_from(Instrument)
-        .where(Instrument.ticker == ticker)
-        .fetch_one(database)
-    )
+    if ticker not in instruments:
+        raise HTTPException(status_code=404, detail="Инструмент не найден")
 
-    if is_instrument_exist is None:
-        raise HTTPException(status_code=404, detail="Инструмент не найден")
+    return Response(content=await get_snapshot(ticker, limit), media_type='application/json')
 
-    bid_orders = await (
-        Select(Order.price, func.sum(Order.qty) - func.sum(Order.filled))
-        .where(
-            Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]),
-            Order.direction == Direction.BUY,
-            Order.ticker == ticker,
-            Order.price.is_not(None)
-        )
-        .group_by(Order.price)
-        .order_by(Order.price.desc())
-        .limit(limit)
-        .fetch_all(database)
-    )
-
-    ask_orders = await (
-        Select(Order.price, func.sum(Order.qty) - func.sum(Order.filled))
-        .where(
-            Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]),
-            Order.direction == Direction.SELL,
-            Order.ticker == ticker,
-            Order.price.is_not(None)
-        )
-        .group_by(Order.price)
-        .order_by(Order.price.asc())
-        .limit(limit)
-        .fetch_all(database)
-    )
 
-    return ORJSONResponse(
-        content=OrderBook(
-            bid_levels=[Level(price=price, qty=qty) for price, qty in bid_orders],
-            ask_levels=[Level(price=price, qty=qty) for price, qty in ask_orders]
-        ).model_dump()
-    )
+@router.websocket('/public/orderbook/{ticker}/stream')
+async def stream_order_book(
+    websocket: WebSocket,
+    ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
+    limit: Annotated[int, Query()] = 10
+):
+    if ticker not in instruments:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION, reason="Инструмент не найден")
+        return
+
+    await websocket.accept()
+
+    try:
+        async with aclosing(stream_book(ticker, limit)) as messages:
+            async for message in messages:
+                await websocket.send_text(message)
+
+        await websocket.close(code=WS_1008_POLICY_VIOLATION, reason="Поток отключён")
+    except HTTPException as error:
+        await websocket.close(code=WS_1013_TRY_AGAIN_LATER, reason=error.detail)
+    except WebSocketDisconnect:
+        pass
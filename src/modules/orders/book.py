@@ -0,0 +1,380 @@
+import uuid
+from bisect import insort, bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, Iterable, TYPE_CHECKING
+
+import orjson
+from asyncpg import Connection
+from everbase import Select
+from loguru import logger
+
+from core.models.engine_state import EngineState
+from core.models.order import Order
+from core.schemes.order import Direction, OrderStatus
+from modules.orders.feed import Feed, Subscriber
+
+if TYPE_CHECKING:
+    from modules.orders.journal import Journal
+
+
+@dataclass(slots=True)
+class BookOrder:
+    id: uuid.UUID
+    user_id: uuid.UUID
+    direction: Direction
+    price: int
+    qty: int
+    filled: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.qty - self.filled
+
+
+@dataclass(slots=True)
+class Fill:
+    order: BookOrder
+    qty: int
+    price: int
+
+
+class BookSide:
+
+    def __init__(self, direction: Direction):
+        self.direction = direction
+
+        self.__levels: dict[int, dict[uuid.UUID, BookOrder]] = {}
+        self.__volumes: dict[int, int] = {}
+        self.__prices: list[int] = []
+
+    def add(self, order: BookOrder) -> None:
+        level = self.__levels.get(order.price)
+
+        if level is None:
+            level = self.__levels[order.price] = {}
+            self.__volumes[order.price] = 0
+            insort(self.__prices, order.price)
+
+        level[order.id] = order
+        self.__volumes[order.price] += order.remaining
+
+    def remove(self, order: BookOrder) -> None:
+        level = self.__levels[order.price]
+        del level[order.id]
+        self.__volumes[order.price] -= order.remaining
+
+        if not level:
+            del self.__levels[order.price]
+            del self.__volumes[order.price]
+            del self.__prices[bisect_left(self.__prices, order.price)]
+
+    def volume(self, price: int) -> int:
+        return self.__volumes.get(price, 0)
+
+    def fill(self, order: BookOrder, qty: int) -> None:
+        order.filled += qty
+        self.__volumes[order.price] -= qty
+
+    def reduce(self, order: BookOrder, qty: int) -> None:
+        self.__volumes[order.price] -= order.qty - qty
+        order.qty = qty
+
+    def levels(self, limit: int) -> list[dict[str, int]]:
+        if self.direction == Direction.BUY:
+            prices = self.__prices[:-limit - 1:-1] if limit > 0 else []
+        else:
+            prices = self.__prices[:max(limit, 0)]
+
+        return [{'price': price, 'qty': self.__volumes[price]} for price in prices]
+
+    def iter_orders(self, price: int | None) -> Iterator[BookOrder]:
+        prices = self.__prices
+
+        if self.direction == Direction.BUY:
+            stop = bisect_left(prices, price) if price is not None else 0
+            index = len(prices) - 1
+
+            while index >= stop:
+                yield from self.__levels[prices[index]].values()
+                index -= 1
+        else:
+            stop = bisect_right(prices, price) if price is not None else len(prices)
+
+            for index in range(stop):
+                yield from self.__levels[prices[index]].values()
+
+
+class Book:
+    SNAPSHOT_CACHE_SIZE = 16
+
+    def __init__(self, ticker: str, is_journaled: bool = False):
+        self.ticker = ticker
+        self.feed = Feed(ticker)
+
+        self.seq = 0
+        self.events: list[tuple] | None = [] if is_journaled else None
+
+        self.__sides = {Direction.BUY: BookSide(Direction.BUY), Direction.SELL: BookSide(Direction.SELL)}
+        self.__orders: dict[uuid.UUID, BookOrder] = {}
+        self.__snapshots: dict[int, bytes] = {}
+
+    def __contains__(self, order_id: uuid.UUID) -> bool:
+        return order_id in self.__orders
+
+    def get(self, order_id: uuid.UUID) -> BookOrder | None:
+        return self.__orders.get(order_id)
+
+    def __publish_levels(self, levels: Iterable[tuple[Direction, int]]) -> None:
+        self.__snapshots.clear()
+
+        if not self.feed:
+            return
+
+        for direction, price in levels:
+            self.feed.publish(
+                orjson.dumps({
+                    'type': 'level',
+                    'direction': direction,
+                    'price': price,
+                    'qty': self.__sides[direction].volume(price)
+                }).decode()
+            )
+
+    def __remove(self, order_id: uuid.UUID) -> BookOrder | None:
+        order = self.__orders.pop(order_id, None)
+
+        if order is not None:
+            self.__sides[order.direction].remove(order)
+
+        return order
+
+    def add(self, order: BookOrder) -> None:
+        self.__sides[order.direction].add(order)
+        self.__orders[order.id] = order
+
+        if self.events is not None:
+            self.events.append(('A', order.id, order.user_id, order.direction, order.price, order.qty, order.filled))
+
+        self.__publish_levels([(order.direction, order.price)])
+
+    def remove(self, order_id: uuid.UUID) -> BookOrder | None:
+        order = self.__remove(order_id)
+
+        if order is not None:
+            if self.events is not None:
+                self.events.append(('R', order_id))
+
+            self.__publish_levels([(order.direction, order.price)])
+
+        return order
+
+    def reduce(self, order_id: uuid.UUID, qty: int) -> None:
+        order = self.__orders[order_id]
+        self.__sides[order.direction].reduce(order, qty)
+
+        if self.events is not None:
+            self.events.append(('Q', order_id, qty))
+
+        self.__publish_levels([(order.direction, order.price)])
+
+    def remove_user(self, user_id: uuid.UUID) -> None:
+        orders = [order for order in self.__orders.values() if order.user_id == user_id]
+
+        for order in orders:
+            self.__remove(order.id)
+
+        if self.events is not None:
+            self.events.append(('U', user_id))
+
+        if orders:
+            self.__publish_levels(dict.fromkeys((order.direction, order.price) for order in orders))
+
+    def opposite(self, direction: Direction, price: int | None) -> Iterator[BookOrder]:
+        opposite_direction = Direction.SELL if direction == Direction.BUY else Direction.BUY
+        return self.__sides[opposite_direction].iter_orders(price)
+
+    def __fill(self, order: BookOrder, qty: int) -> None:
+        self.__sides[order.direction].fill(order, qty)
+
+        if order.remaining == 0:
+            self.__remove(order.id)
+
+        if self.events is not None:
+            self.events.append(('F', order.id, qty))
+
+    def fill(self, order_id: uuid.UUID, qty: int) -> None:
+        order = self.__orders[order_id]
+        self.__fill(order, qty)
+
+        self.__publish_levels([(order.direction, order.price)])
+
+    def apply(self, fills: list[Fill], timestamp: datetime) -> None:
+        for fill in fills:
+            self.__fill(fill.order, fill.qty)
+
+            if self.feed:
+                self.feed.publish(
+                    orjson.dumps({
+                        'type': 'trade',
+                        'ticker': self.ticker,
+                        'amount': fill.qty,
+                        'price': fill.price,
+                        'timestamp': timestamp
+                    }).decode()
+                )
+
+        if fills:
+            self.__publish_levels(dict.fromkeys((fill.order.direction, fill.price) for fill in fills))
+
+    def orders(self) -> Iterator[BookOrder]:
+        yield from self.__sides[Direction.BUY].iter_orders(None)
+        yield from self.__sides[Direction.SELL].iter_orders(None)
+
+    def levels(self, limit: int) -> dict[str, list[dict[str, int]]]:
+        return {
+            'bid_levels': self.__sides[Direction.BUY].levels(limit),
+            'ask_levels': self.__sides[Direction.SELL].levels(limit)
+        }
+
+    def snapshot(self, limit: int) -> bytes:
+        snapshot = self.__snapshots.get(limit)
+
+        if snapshot is None:
+            if len(self.__snapshots) >= self.SNAPSHOT_CACHE_SIZE:
+                self.__snapshots.clear()
+
+            snapshot = self.__snapshots[limit] = orjson.dumps(self.levels(limit))
+
+        return snapshot
+
+    def subscribe(self, limit: int) -> Subscriber:
+        return self.feed.subscribe(orjson.dumps({'type': 'snapshot', **self.levels(limit)}).decode())
+
+
+class OrderBooks:
+
+    def __init__(self, journal: 'Journal'):
+        self.__journal = journal
+        self.__books: dict[str, Book] = {}
+
+    def get(self, ticker: str) -> Book:
+        book = self.__books.get(ticker)
+
+        if book is None:
+            book = self.__books[ticker] = Book(ticker, self.__journal.is_enabled)
+
+        return book
+
+    def __write(self, book: Book) -> None:
+        if self.__journal.write(book):
+            self.__journal.checkpoint(self.__books.values())
+
+    def commit(self, ticker: str, seq: int | None) -> None:
+        if seq is None:
+            return
+
+        book = self.get(ticker)
+        book.seq = seq
+
+        self.__write(book)
+
+    def drop(self, ticker: str) -> None:
+        book = self.__books.pop(ticker, None)
+
+        if book is not None:
+            book.feed.close()
+
+        if self.__journal.is_enabled:
+            self.__journal.reset(ticker)
+
+    def tickers(self) -> list[str]:
+        return list(self.__books)
+
+    def drop_user(self, ticker: str, user_id: uuid.UUID) -> None:
+        book = self.__books.get(ticker)
+
+        if book is None:
+            return
+
+        book.remove_user(user_id)
+
+        if self.__journal.is_enabled:
+            book.seq += 1
+            self.__write(book)
+
+    @staticmethod
+    async def __states(connection: Connection, tickers: list[str]) -> dict[str, int]:
+        return {
+            state['ticker']: state['seq']
+            for state in await (
+                Select(EngineState.ticker, EngineState.seq)
+                .where(EngineState.ticker.in_(tickers))
+                .fetch_all(connection)
+            )
+        }
+
+    async def __load_orders(self, connection: Connection, tickers: list[str], states: dict[str, int]) -> None:
+        orders = await (
+            Select(Order.id, Order.user_id, Order.ticker, Order.direction, Order.price, Order.qty, Order.filled)
+            .where(
+                Order.ticker.in_(tickers),
+                Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]),
+                Order.price.is_not(None)
+            )
+            .order_by(Order.price.asc(), Order.timestamp.asc())
+            .fetch_all(connection)
+        )
+
+        for order in orders:
+            book = self.__books.get(order['ticker'])
+
+            if book is None:
+                book = self.__books[order['ticker']] = Book(order['ticker'])
+                book.seq = states.get(order['ticker'], 0)
+
+            book.add(
+                BookOrder(
+                    id=order['id'],
+                    user_id=order['user_id'],
+                    direction=Direction(order['direction']),
+                    price=order['price'],
+                    qty=order['qty'],
+                    filled=order['filled']
+                )
+            )
+
+    async def reload(self, connection: Connection, ticker: str) -> None:
+        self.drop(ticker)
+
+        states = await self.__states(connection, [ticker])
+        await self.__load_orders(connection, [ticker], states)
+
+        book = self.get(ticker)
+        book.seq = states.get(ticker, 0)
+
+        if self.__journal.is_enabled:
+            book.events = []
+            self.__journal.checkpoint(self.__books.values())
+
+    async def load(self, connection: Connection, tickers: list[str]) -> None:
+        self.__books.clear()
+
+        states = await self.__states(connection, tickers)
+
+        if self.__journal.is_enabled:
+            self.__books = {
+                ticker: book
+                for ticker, book in self.__journal.recover(tickers).items()
+                if book.seq == states.get(ticker, 0)
+            }
+
+            logger.info(f'Из журнала восстановлено стаканов: {len(self.__books)} из {len(tickers)}')
+
+        await self.__load_orders(connection, [ticker for ticker in tickers if ticker not in self.__books], states)
+
+        if self.__journal.is_enabled:
+            for book in self.__books.values():
+                book.events = []
+
+            self.__journal.checkpoint(self.__books.values())
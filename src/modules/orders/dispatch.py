@@ -0,0 +1,184 @@
+import asyncio
+import uuid
+from contextlib import aclosing
+from typing import AsyncIterator
+
+from pydantic import UUID4
+
+from core.objects.candles import candles
+from core.objects.ledger import ledger
+from core.objects.order_books import order_books
+from core.objects.sequencer import sequencer
+from core.objects.shard import shard
+from modules.orders.methods import (
+    amend_order, place_order, place_orders, remove_order, remove_orders, remove_user_orders
+)
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody
+
+
+async def submit_order(user_id: UUID4, order: LimitOrderBody | MarketOrderBody) -> uuid.UUID:
+    if shard.is_local(order.ticker):
+        return await sequencer.submit(order.ticker, place_order, user_id, order)
+
+    order_id = await shard.call(
+        order.ticker, 'place_order', {'user_id': str(user_id), 'order': order.model_dump(mode='json')}
+    )
+
+    return uuid.UUID(order_id)
+
+
+async def submit_cancel(ticker: str, order_id: UUID4) -> bool:
+    if shard.is_local(ticker):
+        return await sequencer.submit(ticker, remove_order, ticker, order_id)
+
+    return await shard.call(ticker, 'remove_order', {'ticker': ticker, 'order_id': str(order_id)})
+
+
+async def submit_orders(user_id: UUID4, ticker: str, orders: list[LimitOrderBody | MarketOrderBody]) -> list[dict]:
+    if shard.is_local(ticker):
+        return await sequencer.submit(ticker, place_orders, user_id, ticker, orders)
+
+    return await shard.call(
+        ticker,
+        'place_orders',
+        {'user_id': str(user_id), 'ticker': ticker, 'orders': [order.model_dump(mode='json') for order in orders]}
+    )
+
+
+async def submit_cancels(ticker: str, order_ids: list[UUID4]) -> list[uuid.UUID]:
+    if shard.is_local(ticker):
+        return await sequencer.submit(ticker, remove_orders, ticker, order_ids)
+
+    order_ids = await shard.call(ticker, 'remove_orders', {'ticker': ticker, 'order_ids': [str(i) for i in order_ids]})
+
+    return [uuid.UUID(order_id) for order_id in order_ids]
+
+
+async def submit_cancel_all(ticker: str, user_id: UUID4) -> list[uuid.UUID]:
+    if shard.is_local(ticker):
+        return await sequencer.submit(ticker, remove_user_orders, ticker, user_id)
+
+    order_ids = await shard.call(ticker, 'remove_user_orders', {'ticker': ticker, 'user_id': str(user_id)})
+
+    return [uuid.UUID(order_id) for order_id in order_ids]
+
+
+async def drop_user_book(ticker: str, user_id: UUID4) -> None:
+    order_books.drop_user(ticker, user_id)
+
+
+async def submit_drop_user(user_id: UUID4) -> None:
+    await asyncio.gather(
+        *(sequencer.submit(ticker, drop_user_book, ticker, user_id) for ticker in order_books.tickers())
+    )
+
+    ledger.drop_user(user_id)
+
+
+async def drop_instrument_book(ticker: str) -> None:
+    order_books.drop(ticker)
+    candles.drop(ticker)
+
+
+async def submit_drop_instrument(ticker: str) -> None:
+    await sequencer.submit(ticker, drop_instrument_book, ticker)
+
+
+async def submit_amend(ticker: str, user_id: UUID4, order_id: UUID4, price: int | None, qty: int | None) -> uuid.UUID:
+    if shard.is_local(ticker):
+        return await sequencer.submit(ticker, amend_order, ticker, user_id, order_id, price, qty)
+
+    order_id = await shard.call(
+        ticker,
+        'amend_order',
+        {'ticker': ticker, 'user_id': str(user_id), 'order_id': str(order_id), 'price': price, 'qty': qty}
+    )
+
+    return uuid.UUID(order_id)
+
+
+async def get_snapshot(ticker: str, limit: int) -> bytes:
+    if shard.is_local(ticker):
+        return order_books.get(ticker).snapshot(limit)
+
+    return (await shard.call(ticker, 'snapshot', {'ticker': ticker, 'limit': limit})).encode()
+
+
+async def stream_book(ticker: str, limit: int) -> AsyncIterator[str]:
+    if not shard.is_local(ticker):
+        async with aclosing(shard.subscribe(ticker, 'subscribe', {'ticker': ticker, 'limit': limit})) as messages:
+            async for message in messages:
+                yield message
+
+        return
+
+    book = order_books.get(ticker)
+    subscriber = book.subscribe(limit)
+
+    try:
+        while (message := await subscriber.get()) is not None:
+            yield message
+    finally:
+        book.feed.unsubscribe(subscriber)
+
+
+def load_order(order: dict) -> LimitOrderBody | MarketOrderBody:
+    return LimitOrderBody(**order) if 'price' in order else MarketOrderBody(**order)
+
+
+@shard.procedure('place_order')
+async def handle_place_order(params: dict) -> str:
+    order = load_order(params['order'])
+
+    return str(await sequencer.submit(order.ticker, place_order, uuid.UUID(params['user_id']), order))
+
+
+@shard.procedure('place_orders')
+async def handle_place_orders(params: dict) -> list[dict]:
+    orders = [load_order(order) for order in params['orders']]
+
+    return await sequencer.submit(
+        params['ticker'], place_orders, uuid.UUID(params['user_id']), params['ticker'], orders
+    )
+
+
+@shard.procedure('remove_order')
+async def handle_remove_order(params: dict) -> bool:
+    return await sequencer.submit(params['ticker'], remove_order, params['ticker'], uuid.UUID(params['order_id']))
+
+
+@shard.procedure('remove_orders')
+async def handle_remove_orders(params: dict) -> list[uuid.UUID]:
+    order_ids = [uuid.UUID(order_id) for order_id in params['order_ids']]
+
+    return await sequencer.submit(params['ticker'], remove_orders, params['ticker'], order_ids)
+
+
+@shard.procedure('remove_user_orders')
+async def handle_remove_user_orders(params: dict) -> list[uuid.UUID]:
+    return await sequencer.submit(params['ticker'], remove_user_orders, params['ticker'], uuid.UUID(params['user_id']))
+
+
+@shard.procedure('amend_order')
+async def handle_amend_order(params: dict) -> str:
+    order_id = await sequencer.submit(
+        params['ticker'],
+        amend_order,
+        params['ticker'],
+        uuid.UUID(params['user_id']),
+        uuid.UUID(params['order_id']),
+        params['price'],
+        params['qty']
+    )
+
+    return str(order_id)
+
+
+@shard.procedure('snapshot')
+async def handle_snapshot(params: dict) -> str:
+    return order_books.get(params['ticker']).snapshot(params['limit']).decode()
+
+
+@shard.stream('subscribe')
+def handle_subscribe(params: dict) -> AsyncIterator[str]:
+    return stream_book(params['ticker'], params['limit'])
@@ -0,0 +1,210 @@
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Protocol
+
+from fastapi import HTTPException
+from pydantic import UUID4
+
+from core.schemes.order import Direction, OrderStatus
+from modules.orders.book import Book, BookOrder, Fill
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody
+
+
+@dataclass(slots=True)
+class Execution:
+    id: uuid.UUID
+    order: LimitOrderBody | MarketOrderBody
+    price: int | None
+    status: OrderStatus
+    filled: int
+    fills: list[Fill]
+    resting: BookOrder | None
+    spent: int
+    timestamp: datetime | None = None
+
+
+def reserved_asset(ticker: str, direction: Direction, price: int | None, qty: int) -> tuple[str, int]:
+    if direction == Direction.SELL:
+        return ticker, qty
+
+    return 'RUB', qty * (price if price is not None else 1)
+
+
+def is_crossing(orders: list[LimitOrderBody | MarketOrderBody]) -> bool:
+    prices: dict[Direction, list[int | None]] = {Direction.BUY: [], Direction.SELL: []}
+
+    for order in orders:
+        prices[order.direction].append(order.price if isinstance(order, LimitOrderBody) else None)
+
+    buy, sell = prices[Direction.BUY], prices[Direction.SELL]
+
+    if not buy or not sell:
+        return False
+
+    if None in buy or None in sell:
+        return True
+
+    return max(buy) >= min(sell)
+
+
+def match(
+    book: Book,
+    user_id: UUID4,
+    order: LimitOrderBody | MarketOrderBody,
+    available: int,
+    consumed: dict[uuid.UUID, int]
+) -> Execution:
+    price = order.price if isinstance(order, LimitOrderBody) else None
+    budget = available if isinstance(order, MarketOrderBody) and order.direction == Direction.BUY else None
+
+    fills: list[Fill] = []
+    filled = 0
+    spent = 0
+
+    for opposite_order in book.opposite(order.direction, price):
+        if order.qty - filled == 0:
+            break
+
+        remaining = opposite_order.remaining - consumed.get(opposite_order.id, 0)
+
+        if remaining == 0:
+            continue
+
+        execute_qty = min(order.qty - filled, remaining)
+
+        if budget is not None:
+            if budget < execute_qty * opposite_order.price:
+                break
+
+            if opposite_order.user_id != user_id:
+                budget -= execute_qty * opposite_order.price
+                spent += execute_qty * opposite_order.price
+
+        fills.append(Fill(order=opposite_order, qty=execute_qty, price=opposite_order.price))
+        filled += execute_qty
+
+    if order.qty == filled:
+        status = OrderStatus.EXECUTED
+    elif isinstance(order, MarketOrderBody):
+        status = OrderStatus.CANCELLED
+        fills, filled, spent = [], 0, 0
+    elif filled > 0:
+        status = OrderStatus.PARTIALLY_EXECUTED
+    else:
+        status = OrderStatus.NEW
+
+    for fill in fills:
+        consumed[fill.order.id] = consumed.get(fill.order.id, 0) + fill.qty
+
+    if isinstance(order, LimitOrderBody):
+        spent = reserved_asset(order.ticker, order.direction, price, order.qty)[1]
+    elif order.direction == Direction.SELL:
+        spent = filled
+
+    execution = Execution(
+        id=uuid.uuid4(),
+        order=order,
+        price=price,
+        status=status,
+        filled=filled,
+        fills=fills,
+        resting=None,
+        spent=spent
+    )
+
+    if status in (OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED):
+        execution.resting = BookOrder(
+            id=execution.id,
+            user_id=user_id,
+            direction=order.direction,
+            price=price,
+            qty=order.qty,
+            filled=filled
+        )
+
+    return execution
+
+
+def required_assets(ticker: str, orders: list[LimitOrderBody | MarketOrderBody]) -> list[str]:
+    return sorted({reserved_asset(ticker, order.direction, None, 1)[0] for order in orders})
+
+
+def plan(
+    book: Book,
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody],
+    available: dict[str, int]
+) -> list[Execution | HTTPException]:
+    results: list[Execution | HTTPException] = []
+    consumed: dict[uuid.UUID, int] = {}
+
+    for order in orders:
+        asset, amount = reserved_asset(
+            ticker, order.direction, order.price if isinstance(order, LimitOrderBody) else None, order.qty
+        )
+
+        if available.get(asset, 0) < amount:
+            results.append(HTTPException(status_code=409, detail="Недостаточно средств"))
+            continue
+
+        execution = match(book, user_id, order, available[asset], consumed)
+        available[asset] -= execution.spent
+
+        results.append(execution)
+
+    return results
+
+
+def apply(book: Book, results: list[Execution | HTTPException]) -> None:
+    for execution in results:
+        if not isinstance(execution, Execution):
+            continue
+
+        book.apply(execution.fills, execution.timestamp)
+
+        if execution.resting is not None:
+            book.add(execution.resting)
+
+
+class Persistence(Protocol):
+
+    async def available(self, user_id: UUID4, assets: list[str]) -> dict[str, int]:
+        ...
+
+    async def write(self, user_id: UUID4, ticker: str, executions: list[Execution]) -> None:
+        ...
+
+
+class NullPersistence:
+
+    def __init__(self, balance: int):
+        self.__balance = balance
+
+    async def available(self, user_id: UUID4, assets: list[str]) -> dict[str, int]:
+        return dict.fromkeys(assets, self.__balance)
+
+    async def write(self, user_id: UUID4, ticker: str, executions: list[Execution]) -> None:
+        timestamp = datetime.now(timezone.utc)
+
+        for execution in executions:
+            execution.timestamp = timestamp
+
+
+async def execute(
+    persistence: Persistence,
+    book: Book,
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody]
+) -> list[Execution | HTTPException]:
+    available = await persistence.available(user_id, required_assets(ticker, orders))
+    results = plan(book, user_id, ticker, orders, available)
+
+    executions = [result for result in results if isinstance(result, Execution)]
+
+    if executions:
+        await persistence.write(user_id, ticker, executions)
+
+    return results
@@ -0,0 +1,63 @@
+import asyncio
+
+from loguru import logger
+
+
+class Subscriber:
+
+    def __init__(self, queue_size: int):
+        self.__queue: asyncio.Queue[str | None] = asyncio.Queue(queue_size)
+
+    def push(self, message: str) -> bool:
+        try:
+            self.__queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    def close(self) -> None:
+        while not self.__queue.empty():
+            self.__queue.get_nowait()
+
+        self.__queue.put_nowait(None)
+
+    async def get(self) -> str | None:
+        return await self.__queue.get()
+
+
+class Feed:
+    QUEUE_SIZE = 1000
+
+    def __init__(self, ticker: str):
+        self.__ticker = ticker
+        self.__subscribers: set[Subscriber] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.__subscribers)
+
+    def subscribe(self, snapshot: str) -> Subscriber:
+        subscriber = Subscriber(self.QUEUE_SIZE)
+        subscriber.push(snapshot)
+
+        self.__subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.__subscribers.discard(subscriber)
+
+    def publish(self, message: str) -> None:
+        for subscriber in list(self.__subscribers):
+            if subscriber.push(message):
+                continue
+
+            logger.warning(f'Подписчик на {self.__ticker} не успевает читать поток и отключён')
+
+            self.__subscribers.discard(subscriber)
+            subscriber.close()
+
+    def close(self) -> None:
+        for subscriber in self.__subscribers:
+            subscriber.close()
+
+        self.__subscribers.clear()
@@ -0,0 +1,272 @@
+import mmap
+import os
+import shutil
+import struct
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator
+
+from loguru import logger
+
+from core.schemes.order import Direction
+from modules.orders.book import Book, BookOrder
+
+FRAME = struct.Struct('<IIqH')
+SNAPSHOT = struct.Struct('<qI')
+
+ORDER = struct.Struct('<c16s16sBqqq')
+ORDER_ID = struct.Struct('<c16s')
+ORDER_QTY = struct.Struct('<c16sq')
+
+DIRECTIONS = (Direction.BUY, Direction.SELL)
+
+
+def encode(events: Iterable[tuple]) -> bytes:
+    chunks = []
+
+    for event in events:
+        kind = event[0].encode()
+
+        if kind == b'A':
+            _, order_id, user_id, direction, price, qty, filled = event
+            chunks.append(
+                ORDER.pack(kind, order_id.bytes, user_id.bytes, DIRECTIONS.index(direction), price, qty, filled)
+            )
+        elif kind in (b'Q', b'F'):
+            chunks.append(ORDER_QTY.pack(kind, event[1].bytes, event[2]))
+        else:
+            chunks.append(ORDER_ID.pack(kind, event[1].bytes))
+
+    return b''.join(chunks)
+
+
+def replay(book: Book, data: memoryview, offset: int, end: int) -> None:
+    while offset < end:
+        kind = data[offset:offset + 1].tobytes()
+
+        if kind == b'A':
+            _, order_id, user_id, direction, price, qty, filled = ORDER.unpack_from(data, offset)
+            offset += ORDER.size
+
+            book.add(
+                BookOrder(
+                    id=uuid.UUID(bytes=order_id),
+                    user_id=uuid.UUID(bytes=user_id),
+                    direction=DIRECTIONS[direction],
+                    price=price,
+                    qty=qty,
+                    filled=filled
+                )
+            )
+        elif kind in (b'Q', b'F'):
+            _, order_id, qty = ORDER_QTY.unpack_from(data, offset)
+            offset += ORDER_QTY.size
+
+            if kind == b'Q':
+                book.reduce(uuid.UUID(bytes=order_id), qty)
+            else:
+                book.fill(uuid.UUID(bytes=order_id), qty)
+        elif kind in (b'R', b'U'):
+            _, value = ORDER_ID.unpack_from(data, offset)
+            offset += ORDER_ID.size
+
+            if kind == b'R':
+                book.remove(uuid.UUID(bytes=value))
+            else:
+                book.remove_user(uuid.UUID(bytes=value))
+        else:
+            raise ValueError(f'Неизвестное событие {kind!r}')
+
+
+@contextmanager
+def mapped(path: str) -> Iterator[memoryview]:
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield memoryview(b'')
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory, memoryview(memory) as data:
+            yield data
+
+
+def sync_directory(path: str) -> None:
+    descriptor = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class Journal:
+
+    def __init__(self, *, is_enabled: bool, directory: str, segment_size: int):
+        self.__is_enabled = is_enabled
+        self.__root = directory
+        self.__segment_size = segment_size
+
+        self.__directory = directory
+        self.__file: BinaryIO | None = None
+        self.__size = 0
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.__is_enabled
+
+    def __segment_path(self, segment: int) -> str:
+        return os.path.join(self.__directory, f'{segment:08d}.journal')
+
+    def __snapshot_path(self, ticker: str) -> str:
+        return os.path.join(self.__directory, f'{ticker}.snapshot')
+
+    def __segments(self) -> list[int]:
+        return sorted(
+            int(name.removesuffix('.journal')) for name in os.listdir(self.__directory) if name.endswith('.journal')
+        )
+
+    def open(self, slot: int) -> None:
+        self.__directory = os.path.join(self.__root, f'worker-{slot}')
+
+        if self.__is_enabled:
+            os.makedirs(self.__directory, exist_ok=True)
+        elif os.path.isdir(self.__directory):
+            shutil.rmtree(self.__directory)
+            logger.info('Журнал стаканов выключен, устаревшие снимки удалены')
+
+    def __read_snapshot(self, ticker: str) -> Book | None:
+        with mapped(self.__snapshot_path(ticker)) as data:
+            if len(data) < SNAPSHOT.size:
+                return None
+
+            seq, checksum = SNAPSHOT.unpack_from(data)
+
+            if zlib.crc32(data[SNAPSHOT.size:]) != checksum:
+                logger.warning(f'Снимок стакана {ticker} повреждён')
+                return None
+
+            book = Book(ticker)
+            book.seq = seq
+
+            replay(book, data, SNAPSHOT.size, len(data))
+
+        return book
+
+    def recover(self, tickers: list[str]) -> dict[str, Book]:
+        tickers = set(tickers)
+        books: dict[str, Book] = {}
+        broken: set[str] = set()
+
+        for name in os.listdir(self.__directory):
+            if name.endswith('.snapshot') and (ticker := name.removesuffix('.snapshot')) in tickers:
+                if (book := self.__read_snapshot(ticker)) is not None:
+                    books[ticker] = book
+
+        for segment in self.__segments():
+            with mapped(self.__segment_path(segment)) as data:
+                offset = 0
+
+                while offset + FRAME.size <= len(data):
+                    size, checksum, seq, length = FRAME.unpack_from(data, offset)
+                    start = offset + FRAME.size
+                    end = start + length + size
+
+                    if end > len(data) or zlib.crc32(data[start:end]) != checksum:
+                        logger.warning(f'Журнал {segment} обрывается на смещении {offset}')
+                        break
+
+                    offset = end
+                    ticker = data[start:start + length].tobytes().decode()
+
+                    if ticker not in tickers or ticker in broken:
+                        continue
+
+                    book = books.get(ticker)
+
+                    if seq == 0:
+                        books[ticker] = Book(ticker)
+                        continue
+
+                    if book is None and seq == 1:
+                        book = books[ticker] = Book(ticker)
+
+                    if book is not None and seq <= book.seq:
+                        continue
+
+                    if book is None or seq != book.seq + 1:
+                        broken.add(ticker)
+                        books.pop(ticker, None)
+                        continue
+
+                    try:
+                        replay(book, data, start + length, end)
+                    except (KeyError, ValueError):
+                        broken.add(ticker)
+                        books.pop(ticker, None)
+                        continue
+
+                    book.seq = seq
+
+        return books
+
+    def write(self, book: Book) -> bool:
+        ticker = book.ticker.encode()
+        events = encode(book.events or ())
+        book.events.clear()
+
+        self.__file.write(
+            FRAME.pack(len(events), zlib.crc32(ticker + events), book.seq, len(ticker)) + ticker + events
+        )
+        self.__file.flush()
+
+        self.__size += FRAME.size + len(ticker) + len(events)
+
+        return self.__size >= self.__segment_size
+
+    def reset(self, ticker: str) -> None:
+        book = Book(ticker, is_journaled=True)
+        self.write(book)
+
+    def checkpoint(self, books: Iterable[Book]) -> None:
+        names = set()
+
+        for book in books:
+            path = self.__snapshot_path(book.ticker)
+            names.add(os.path.basename(path))
+
+            data = encode(
+                ('A', order.id, order.user_id, order.direction, order.price, order.qty, order.filled)
+                for order in book.orders()
+            )
+
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(SNAPSHOT.pack(book.seq, zlib.crc32(data)) + data)
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(f'{path}.tmp', path)
+
+        sync_directory(self.__directory)
+
+        for name in os.listdir(self.__directory):
+            if name.endswith('.snapshot') and name not in names:
+                os.unlink(os.path.join(self.__directory, name))
+
+        if self.__file is not None:
+            self.__file.close()
+
+        segments = self.__segments()
+
+        for segment in segments:
+            os.unlink(self.__segment_path(segment))
+
+        self.__file = open(self.__segment_path(segments[-1] + 1 if segments else 0), 'ab')
+        self.__size = 0
+
+        sync_directory(self.__directory)
+
+    def close(self) -> None:
+        if self.__file is not None:
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+            self.__file = None
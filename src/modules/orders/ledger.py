@@ -0,0 +1,66 @@
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from asyncpg import Connection
+from everbase import Select
+
+from core.models.balance import Balance
+
+
+class Ledger:
+
+    def __init__(self):
+        self.__balances: dict[tuple[uuid.UUID, str], list[int]] = {}
+        self.__applied: ContextVar[list | None] = ContextVar('applied', default=None)
+
+    async def load(self, connection: Connection) -> None:
+        self.__balances = {
+            (balance['user_id'], balance['ticker']): [balance['amount'], balance['reserved']]
+            for balance in await (
+                Select(Balance.user_id, Balance.ticker, Balance.amount, Balance.reserved)
+                .fetch_all(connection)
+            )
+        }
+
+    def available(self, user_id: uuid.UUID, assets: list[str]) -> dict[str, int]:
+        return {
+            asset: balance[0] - balance[1]
+            for asset in assets
+            if (balance := self.__balances.get((user_id, asset))) is not None
+        }
+
+    def __apply(self, deltas: dict[tuple[uuid.UUID, str], list[int]], sign: int) -> None:
+        for key, delta in deltas.items():
+            balance = self.__balances.setdefault(key, [0, 0])
+            balance[0] += sign * delta[0]
+            balance[1] += sign * delta[1]
+
+    def apply(self, deltas: dict[tuple[uuid.UUID, str], list[int]]) -> None:
+        self.__apply(deltas, 1)
+
+        if (applied := self.__applied.get()) is not None:
+            applied.append(deltas)
+
+    def revert(self, deltas: dict[tuple[uuid.UUID, str], list[int]]) -> None:
+        self.__apply(deltas, -1)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        applied = []
+        token = self.__applied.set(applied)
+
+        try:
+            yield
+        except BaseException:
+            for deltas in reversed(applied):
+                self.__apply(deltas, -1)
+
+            raise
+        finally:
+            self.__applied.reset(token)
+
+    def drop_user(self, user_id: uuid.UUID) -> None:
+        for key in [key for key in self.__balances if key[0] == user_id]:
+            del self.__balances[key]
@@ -1,157 +1,479 @@
+import time
+import uuid
+from collections import defaultdict
+from typing import AsyncIterator
+
 from asyncpg import Connection, Record
-from everbase import Select, Insert, Update
 from fastapi import HTTPException
+from loguru import logger
 from pydantic import UUID4
-from sqlalchemy import func
-
-from core.models.balance import Balance
-from core.models.order import Order
-from core.models.transaction import Transaction
-from core.schemes.order import Direction, OrderStatus
-from modules.orders.schemes import LimitOrderBody, OrderModel, MarketOrderBody
-
-
-async def deposit(transaction: Connection, user_id: UUID4, ticker: str, amount: int):
-    await (
-        (query := (
-            Insert(Balance)
-            .values(user_id=user_id, ticker=ticker, amount=amount)
-        ))
-        .on_conflict_do_update(
-            index_elements=(Balance.user_id, Balance.ticker),
-            set_={'amount': Balance.amount + query.excluded.amount}
-        )
-        .execute(transaction)
-    )
 
+from core.config.settings import settings
+from core.methods.pool import bulk_insert
+from core.objects.candles import candles
+from core.objects.database import database
+from core.objects.instruments import instruments
+from core.objects.journal import journal
+from core.objects.ledger import ledger
+from core.objects.metrics import order_stage_duration, order_fills
+from core.objects.order_books import order_books
+from core.objects.statements import statements
+from core.objects.writer import writer
+from core.schemes.order import OrderStatus
+from modules.candles.rollup import aggregate
+from modules.orders import engine
+from modules.orders.engine import Execution, reserved_asset
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody, LIMIT_ORDER_SERIALIZER, MARKET_ORDER_SERIALIZER
+from modules.orders.settlement import INSERT_ORDER_ROWS, ORDER_COLUMNS, order_rows, prepare, settle, stamp
 
-async def withdraw(transaction: Connection, user_id: UUID4, ticker: str, amount: int):
-    await (
-        Update(Balance)
-        .values(amount=Balance.amount - amount)
-        .where(Balance.user_id == user_id, Balance.ticker == ticker, Balance.amount >= amount)
-        .execute(transaction)
-    )
 
+SELECT_AVAILABLE = statements.register(
+    'select_available',
+    """
+    SELECT ticker, amount - reserved AS available FROM balances
+    WHERE user_id = $1 AND ticker = ANY($2::text[])
+    FOR UPDATE
+    """
+)
 
-async def execute_order(connection: Connection, order: OrderModel, order_direction: Direction, order_ticker: str):
-    whereclause = [
-        Order.direction != order_direction,
-        Order.ticker == order_ticker,
-        Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]),
-        Order.price.is_not(None)
-    ]
+RELEASE_RESERVED = """
+    UPDATE balances SET reserved = balances.reserved - v.amount
+    FROM unnest($1::uuid[], $2::text[], $3::integer[]) AS v(user_id, ticker, amount)
+    WHERE balances.user_id = v.user_id AND balances.ticker = v.ticker
+"""
 
-    order_by = []
+ADVANCE_ENGINE_STATE = statements.register(
+    'advance_engine_state',
+    """
+    INSERT INTO engine_state (ticker, seq) VALUES ($1, 1)
+    ON CONFLICT (ticker) DO UPDATE SET seq = engine_state.seq + 1
+    RETURNING seq
+    """
+)
 
-    if order_direction == Direction.BUY:
-        if isinstance(order, LimitOrderBody):
-            whereclause.append(Order.price <= order.price)
+CANCEL_ORDERS = """
+    UPDATE orders SET status = 'CANCELLED'
+    WHERE id = ANY($1::uuid[]) AND status IN ('NEW', 'PARTIALLY_EXECUTED')
+    RETURNING id, user_id, direction, price, qty, filled
+"""
 
-        order_by.append(Order.price.asc())
-    else:
-        if isinstance(order, LimitOrderBody):
-            whereclause.append(Order.price >= order.price)
+AMEND_QTY = """
+    UPDATE orders SET qty = $2
+    WHERE id = $1 AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND filled < $2
+    RETURNING id
+"""
 
-        order_by.append(Order.price.desc())
+CANCEL_USER_ORDERS = """
+    UPDATE orders SET status = 'CANCELLED'
+    WHERE user_id = $1 AND ticker = $2 AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL
+    RETURNING id, user_id, direction, price, qty, filled
+"""
 
-    opposite_orders = await (
-        Select(Order.id, Order.user_id, Order.price, Order.qty, Order.filled, Order.status)
-        .where(*whereclause)
-        .order_by(*order_by, Order.timestamp.asc())
-        .fetch_all(connection, model=OrderModel)
+CANCEL_TICKER_ORDERS = """
+    UPDATE orders SET status = 'CANCELLED'
+    WHERE ticker = $1 AND status IN ('NEW', 'PARTIALLY_EXECUTED') AND price IS NOT NULL
+    RETURNING id, user_id, direction, price, qty, filled
+"""
+
+SELECT_USER_ORDERS = """
+    (
+        SELECT id, status, user_id, timestamp, ticker, direction, qty, price, filled FROM orders
+        WHERE user_id = $1{status}{cursor}
+        ORDER BY timestamp, id
+        LIMIT $2
+    )
+    UNION ALL
+    (
+        SELECT id, status, user_id, timestamp, ticker, direction, qty, price, filled FROM orders_archive
+        WHERE user_id = $1{status}{cursor}
+        ORDER BY timestamp, id
+        LIMIT $2
     )
+    ORDER BY timestamp, id
+    LIMIT $2
+"""
+
+STATUS_FILTER = " AND status = ANY(${}::orderstatus[])"
+AFTER_KEY = " AND (timestamp, id) > (${}, ${})"
+
+ORDERS_BATCH_SIZE = 1000
+
+
+def observe_stage(stage: str, start_time: float) -> float:
+    end_time = time.perf_counter()
+    order_stage_duration.observe(end_time - start_time, stage)
+
+    return end_time
+
+
+class DatabasePersistence:
+
+    def __init__(self, connection: Connection):
+        self.__connection = connection
+        self.__start_time = time.perf_counter()
+
+    async def available(self, user_id: UUID4, assets: list[str]) -> dict[str, int]:
+        if writer.is_enabled:
+            available = ledger.available(user_id, assets)
+        else:
+            available = {
+                balance['ticker']: balance['available']
+                for balance in await self.__connection.fetch_statement(SELECT_AVAILABLE, user_id, assets)
+            }
+
+        self.__start_time = observe_stage('reserve', self.__start_time)
+
+        return available
+
+    async def write(self, user_id: UUID4, ticker: str, executions: list[Execution]) -> None:
+        start_time = observe_stage('match', self.__start_time)
+
+        stamp(executions)
+
+        await bulk_insert(
+            self.__connection, 'orders', ORDER_COLUMNS, order_rows(user_id, ticker, executions), INSERT_ORDER_ROWS,
+            settings.database.copy_threshold
+        )
+
+        start_time = observe_stage('insert', start_time)
+
+        settlement = prepare(ticker, user_id, executions)
+        await settle(self.__connection, ticker, settlement)
+
+        if writer.is_enabled:
+            ledger.apply(settlement.deltas)
+
+        observe_stage('settle', start_time)
+
+
+class AsyncPersistence:
+
+    def __init__(self):
+        self.seq: int | None = None
+        self.__start_time = time.perf_counter()
+
+    async def available(self, user_id: UUID4, assets: list[str]) -> dict[str, int]:
+        await writer.reserve()
+
+        self.__start_time = observe_stage('reserve', self.__start_time)
+
+        return ledger.available(user_id, assets)
+
+    async def write(self, user_id: UUID4, ticker: str, executions: list[Execution]) -> None:
+        observe_stage('match', self.__start_time)
+
+        stamp(executions)
+
+        settlement = prepare(ticker, user_id, executions)
+        ledger.apply(settlement.deltas)
+
+        if journal.is_enabled:
+            self.seq = order_books.get(ticker).seq + 1
+
+        writer.submit(ticker, user_id, order_rows(user_id, ticker, executions), settlement, self.seq)
+
+
+async def advance(connection: Connection, ticker: str) -> int | None:
+    if not journal.is_enabled:
+        return None
+
+    return await connection.fetchval_statement(ADVANCE_ENGINE_STATE, ticker)
+
+
+async def write_orders(
+    connection: Connection,
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody]
+) -> list[Execution | HTTPException]:
+    return await engine.execute(DatabasePersistence(connection), order_books.get(ticker), user_id, ticker, orders)
+
+
+def apply_orders(ticker: str, results: list[Execution | HTTPException]) -> None:
+    engine.apply(order_books.get(ticker), results)
+
+    trades = []
+
+    for execution in results:
+        if isinstance(execution, Execution):
+            order_fills.observe(len(execution.fills))
+            trades.extend((execution.timestamp, fill.price, fill.qty) for fill in execution.fills)
+
+    if trades:
+        candles.update(ticker, aggregate(trades))
+
+
+async def execute_orders(
+    connection: Connection,
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody]
+) -> list[Execution | HTTPException]:
+    async with connection.transaction():
+        results = await write_orders(connection, user_id, ticker, orders)
+        seq = await advance(connection, ticker)
+        start_time = time.perf_counter()
+
+    start_time = observe_stage('commit', start_time)
+
+    apply_orders(ticker, results)
+    order_books.commit(ticker, seq)
+
+    observe_stage('apply', start_time)
+
+    return results
+
+
+async def recover_book(ticker: str) -> None:
+    if not writer.is_halted(ticker):
+        return
+
+    await writer.barrier()
+
+    async with database.get_connection() as connection:
+        await order_books.reload(connection, ticker)
+
+    writer.resume(ticker)
+
+    logger.info(f'Стакан {ticker} перезагружен из базы')
+
+
+async def queue_orders(
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody]
+) -> list[Execution | HTTPException]:
+    await recover_book(ticker)
+
+    persistence = AsyncPersistence()
+    results = await engine.execute(persistence, order_books.get(ticker), user_id, ticker, orders)
+
+    start_time = time.perf_counter()
+
+    apply_orders(ticker, results)
+    order_books.commit(ticker, persistence.seq)
+
+    observe_stage('apply', start_time)
+
+    return results
+
+
+async def run_orders(
+    user_id: UUID4,
+    ticker: str,
+    orders: list[LimitOrderBody | MarketOrderBody]
+) -> list[Execution | HTTPException]:
+    if writer.is_enabled:
+        return await queue_orders(user_id, ticker, orders)
+
+    async with database.get_connection() as connection:
+        return await execute_orders(connection, user_id, ticker, orders)
+
 
-    try:
-        async with connection.transaction():
-            for opposite_order in opposite_orders:
-                if order.qty - order.filled == 0:
-                    break
-
-                execute_price = opposite_order.price
-
-                execute_qty = min(
-                    order.qty - order.filled,
-                    opposite_order.qty - opposite_order.filled
-                )
-
-                if isinstance(order, MarketOrderBody) and order_direction == Direction.BUY:
-                    balance = await (
-                        Select(Balance.amount)
-                        .where(Balance.user_id == order.user_id, Balance.ticker == 'RUB')
-                        .fetch_one(connection)
-                    )
-
-                    order_balance: Record = await (
-                        Select(func.sum((Order.qty - Order.filled) * Order.price).label('amount'))
-                        .where(
-                            Order.direction == Direction.BUY,
-                            Order.user_id == order.user_id,
-                            Order.price.is_not(None),
-                            Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED])
-                        )
-                        .fetch_one(connection)
-                    )
-
-                    if balance['amount'] - (order_balance['amount'] or 0) < execute_qty * execute_price:
-                        break
-
-                await (
-                    Insert(Transaction)
-                    .values(
-                        ticker=order_ticker,
-                        amount=execute_qty,
-                        price=execute_price,
-                        buyer_user_id=order.user_id if order_direction == Direction.BUY else opposite_order.user_id,
-                        seller_user_id=opposite_order.user_id if order_direction == Direction.BUY else order.user_id,
-                        buyer_order_id=order.id if order_direction == Direction.BUY else opposite_order.id,
-                        seller_order_id=opposite_order.id if order_direction == Direction.BUY else order.id
-                    )
-                    .execute(connection)
-                )
-
-                if order_direction == Direction.BUY:
-                    await withdraw(connection, order.user_id, "RUB", execute_qty * execute_price)
-                    await withdraw(connection, opposite_order.user_id, order_ticker, execute_qty)
-
-                    await deposit(connection, order.user_id, order_ticker, execute_qty)
-                    await deposit(connection, opposite_order.user_id, "RUB", execute_qty * execute_price)
-                else:
-                    await withdraw(connection, order.user_id, order_ticker, execute_qty)
-                    await withdraw(connection, opposite_order.user_id, "RUB", execute_qty * execute_price)
-
-                    await deposit(connection, order.user_id, "RUB", execute_qty * execute_price)
-                    await deposit(connection, opposite_order.user_id, order_ticker, execute_qty)
-
-                order.filled += execute_qty
-                opposite_order.filled += execute_qty
-
-                if opposite_order.filled == opposite_order.qty:
-                    opposite_order.status = OrderStatus.EXECUTED
-                else:
-                    opposite_order.status = OrderStatus.PARTIALLY_EXECUTED
-
-            if order.qty == order.filled:
-                order.status = OrderStatus.EXECUTED
-            elif isinstance(order, MarketOrderBody):
-                raise ValueError()
-            elif order.filled > 0:
-                order.status = OrderStatus.PARTIALLY_EXECUTED
-
-            for order_ in opposite_orders + [order]:
-                if order_.status not in (OrderStatus.EXECUTED, OrderStatus.PARTIALLY_EXECUTED):
-                    continue
-
-                await (
-                    Update(Order)
-                    .values(status=order_.status, filled=order_.filled)
-                    .where(Order.id == order_.id)
-                    .execute(connection)
-                )
-    except ValueError:
-        await (
-            Update(Order)
-            .values(status=OrderStatus.CANCELLED)
-            .where(Order.id == order.id)
-            .execute(connection)
+def dump_order(order: Record) -> bytes:
+    if order['price'] is not None:
+        return LIMIT_ORDER_SERIALIZER.dumps(order)
+
+    return MARKET_ORDER_SERIALIZER.dumps(order)
+
+
+async def iter_user_orders(
+    user_id: UUID4,
+    statuses: list[OrderStatus] | None,
+    after: Record | None,
+    limit: int | None
+) -> AsyncIterator[bytes]:
+    status = ''
+    filters = ()
+
+    if statuses:
+        status = STATUS_FILTER.format(3)
+        filters = (sorted(set(statuses)),)
+
+    cursor = (after['timestamp'], after['id']) if after is not None else ()
+    remaining = limit
+    separator = b''
+
+    yield b'['
+
+    while remaining is None or remaining > 0:
+        batch_size = ORDERS_BATCH_SIZE if remaining is None else min(remaining, ORDERS_BATCH_SIZE)
+        query = SELECT_USER_ORDERS.format(
+            status=status,
+            cursor=AFTER_KEY.format(3 + len(filters), 4 + len(filters)) if cursor else ''
         )
+
+        async with database.get_connection() as connection:
+            orders = await connection.fetch(query, user_id, batch_size, *filters, *cursor)
+
+        if not orders:
+            break
+
+        yield separator + b','.join(dump_order(order) for order in orders)
+        separator = b','
+
+        if len(orders) < batch_size:
+            break
+
+        cursor = (orders[-1]['timestamp'], orders[-1]['id'])
+
+        if remaining is not None:
+            remaining -= len(orders)
+
+    yield b']'
+
+
+async def place_order(user_id: UUID4, order: LimitOrderBody | MarketOrderBody) -> uuid.UUID:
+    if order.ticker not in instruments:
+        raise HTTPException(status_code=404, detail="Инструмент не найден")
+
+    result = (await run_orders(user_id, order.ticker, [order]))[0]
+
+    if isinstance(result, HTTPException):
+        raise result
+
+    return result.id
+
+
+async def place_orders(user_id: UUID4, ticker: str, orders: list[LimitOrderBody | MarketOrderBody]) -> list[dict]:
+    if ticker not in instruments:
+        return [{'success': False, 'detail': "Инструмент не найден"} for _ in orders]
+
+    results = await run_orders(user_id, ticker, orders)
+
+    return [
+        {'success': True, 'order_id': result.id} if isinstance(result, Execution) else
+        {'success': False, 'detail': result.detail}
+        for result in results
+    ]
+
+
+async def release_reserved(
+    connection: Connection,
+    ticker: str,
+    orders: list[Record]
+) -> dict[tuple[uuid.UUID, str], list[int]]:
+    released: dict[tuple[uuid.UUID, str], int] = defaultdict(int)
+
+    for order in orders:
+        asset, amount = reserved_asset(ticker, order['direction'], order['price'], order['qty'] - order['filled'])
+        released[(order['user_id'], asset)] += amount
+
+    if released:
+        keys = sorted(released)
+
+        await connection.execute(
+            RELEASE_RESERVED,
+            [key[0] for key in keys],
+            [key[1] for key in keys],
+            [released[key] for key in keys]
+        )
+
+    return {key: [0, -amount] for key, amount in released.items()}
+
+
+async def release_ticker_orders(connection: Connection, ticker: str) -> dict[tuple[uuid.UUID, str], list[int]]:
+    return await release_reserved(connection, ticker, await connection.fetch(CANCEL_TICKER_ORDERS, ticker))
+
+
+async def cancel_orders(ticker: str, query: str, *args) -> list[uuid.UUID]:
+    if writer.is_enabled:
+        await recover_book(ticker)
+        await writer.barrier()
+
+    async with database.get_connection() as connection, connection.transaction():
+        orders = await connection.fetch(query, *args)
+        released = await release_reserved(connection, ticker, orders)
+        seq = await advance(connection, ticker)
+
+    if writer.is_enabled:
+        ledger.apply(released)
+
+    book = order_books.get(ticker)
+
+    for order in orders:
+        book.remove(order['id'])
+
+    order_books.commit(ticker, seq)
+
+    return [uuid.UUID(str(order['id'])) for order in orders]
+
+
+async def remove_order(ticker: str, order_id: UUID4) -> bool:
+    return bool(await cancel_orders(ticker, CANCEL_ORDERS, [order_id]))
+
+
+async def remove_orders(ticker: str, order_ids: list[UUID4]) -> list[uuid.UUID]:
+    return await cancel_orders(ticker, CANCEL_ORDERS, order_ids)
+
+
+async def remove_user_orders(ticker: str, user_id: UUID4) -> list[uuid.UUID]:
+    return await cancel_orders(ticker, CANCEL_USER_ORDERS, user_id, ticker)
+
+
+async def amend_order(ticker: str, user_id: UUID4, order_id: UUID4, price: int | None, qty: int | None) -> uuid.UUID:
+    if writer.is_enabled:
+        await recover_book(ticker)
+
+    book = order_books.get(ticker)
+    order = book.get(order_id)
+
+    if order is None or order.user_id != user_id:
+        raise HTTPException(status_code=409, detail="Ордер нельзя изменить")
+
+    price = price if price is not None else order.price
+    qty = qty if qty is not None else order.qty
+
+    if qty <= order.filled:
+        raise HTTPException(status_code=409, detail="Ордер нельзя изменить")
+
+    if writer.is_enabled:
+        await writer.barrier()
+
+    if price == order.price and qty <= order.qty:
+        if qty == order.qty:
+            return order_id
+
+        async with database.get_connection() as connection, connection.transaction():
+            if await connection.fetchval(AMEND_QTY, order_id, qty) is None:
+                raise HTTPException(status_code=409, detail="Ордер нельзя изменить")
+
+            asset, amount = reserved_asset(ticker, order.direction, price, order.qty - qty)
+            await connection.execute(RELEASE_RESERVED, [user_id], [asset], [amount])
+            seq = await advance(connection, ticker)
+
+        if writer.is_enabled:
+            ledger.apply({(user_id, asset): [0, -amount]})
+
+        book.reduce(order_id, qty)
+        order_books.commit(ticker, seq)
+
+        return order_id
+
+    replacement = LimitOrderBody(ticker=ticker, direction=order.direction, qty=qty - order.filled, price=price)
+
+    async with database.get_connection() as connection:
+        with ledger.transaction():
+            async with connection.transaction():
+                cancelled = await connection.fetch(CANCEL_ORDERS, [order_id])
+
+                if not cancelled:
+                    raise HTTPException(status_code=409, detail="Ордер нельзя изменить")
+
+                released = await release_reserved(connection, ticker, cancelled)
+
+                if writer.is_enabled:
+                    ledger.apply(released)
+
+                result = (await write_orders(connection, user_id, ticker, [replacement]))[0]
+
+                if isinstance(result, HTTPException):
+                    raise result
+
+                seq = await advance(connection, ticker)
+
+    book.remove(order_id)
+    apply_orders(ticker, [result])
+    order_books.commit(ticker, seq)
+
+    return result.id
@@ -1,10 +1,9 @@
-import uuid
-from datetime import datetime
 from typing import Annotated
 
-from pydantic import BaseModel, Field, UUID4, BeforeValidator
+from pydantic import BaseModel, Field
 
-from core.schemes.order import Direction, OrderStatus
+from core.methods.serializer import RecordSerializer, as_str
+from core.schemes.order import Direction
 
 
 class LimitOrderBody(BaseModel):
@@ -20,37 +19,24 @@ class MarketOrderBody(BaseModel):
     qty: Annotated[int, Field(ge=1)]
 
 
-class LimitOrderModel(BaseModel):
-    id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    status: OrderStatus
-    user_id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    timestamp: datetime
-    body: LimitOrderBody
-    filled: Annotated[int, Field(ge=0)]
+class AmendOrderBody(BaseModel):
+    price: Annotated[int | None, Field(gt=0)] = None
+    qty: Annotated[int | None, Field(ge=1)] = None
 
 
-class MarketOrderModel(BaseModel):
-    id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    status: OrderStatus
-    user_id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    timestamp: datetime
-    body: MarketOrderBody
+LIMIT_ORDER_SERIALIZER = RecordSerializer({
+    'id': as_str('id'),
+    'status': 'status',
+    'user_id': as_str('user_id'),
+    'timestamp': 'timestamp',
+    'body': RecordSerializer({'ticker': 'ticker', 'direction': 'direction', 'qty': 'qty', 'price': 'price'}),
+    'filled': 'filled'
+})
 
-
-class Level(BaseModel):
-    price: Annotated[int, Field(ge=0)]
-    qty: Annotated[int, Field(ge=0)]
-
-
-class OrderBook(BaseModel):
-    bid_levels: list[Level]
-    ask_levels: list[Level]
-
-
-class OrderModel(BaseModel):
-    id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    status: OrderStatus
-    user_id: Annotated[UUID4, BeforeValidator(lambda v: uuid.UUID(str(v)))]
-    qty: Annotated[int, Field(ge=1)]
-    filled: Annotated[int, Field(ge=0)]
-    price: Annotated[int | None, Field(gt=0)]
+MARKET_ORDER_SERIALIZER = RecordSerializer({
+    'id': as_str('id'),
+    'status': 'status',
+    'user_id': as_str('user_id'),
+    'timestamp': 'timestamp',
+    'body': RecordSerializer({'ticker': 'ticker', 'direction': 'direction', 'qty': 'qty'})
+})
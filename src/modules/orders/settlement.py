@@ -0,0 +1,166 @@
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from asyncpg import Connection
+from pydantic import UUID4
+
+from core.config.settings import settings
+from core.methods.pool import bulk_insert
+from core.objects.clock import clock
+from core.schemes.order import Direction, OrderStatus
+from modules.candles.rollup import aggregate, write_candles
+from modules.orders.engine import Execution, reserved_asset
+
+ORDER_COLUMNS = ['id', 'user_id', 'ticker', 'direction', 'status', 'qty', 'filled', 'price', 'timestamp']
+
+INSERT_ORDER_ROWS = """
+    INSERT INTO orders (id, user_id, ticker, direction, status, qty, filled, price, timestamp)
+    SELECT * FROM unnest(
+        $1::uuid[], $2::uuid[], $3::text[], $4::direction[], $5::orderstatus[],
+        $6::integer[], $7::integer[], $8::integer[], $9::timestamptz[]
+    )
+"""
+
+TRANSACTION_COLUMNS = [
+    'ticker', 'amount', 'price', 'buyer_user_id', 'seller_user_id', 'buyer_order_id', 'seller_order_id', 'timestamp'
+]
+
+INSERT_TRANSACTIONS = """
+    INSERT INTO transactions (
+        ticker, amount, price, buyer_user_id, seller_user_id, buyer_order_id, seller_order_id, timestamp
+    )
+    SELECT * FROM unnest(
+        $1::text[], $2::integer[], $3::integer[], $4::uuid[], $5::uuid[], $6::uuid[], $7::uuid[], $8::timestamptz[]
+    )
+"""
+
+UPDATE_BALANCES = """
+    INSERT INTO balances (user_id, ticker, amount, reserved)
+    SELECT * FROM unnest($1::uuid[], $2::text[], $3::integer[], $4::integer[])
+    ON CONFLICT (user_id, ticker) DO UPDATE
+    SET amount = balances.amount + excluded.amount, reserved = balances.reserved + excluded.reserved
+"""
+
+UPDATE_ORDERS = """
+    UPDATE orders SET status = v.status, filled = v.filled
+    FROM unnest($1::uuid[], $2::orderstatus[], $3::integer[]) AS v(id, status, filled)
+    WHERE orders.id = v.id
+"""
+
+
+def stamp(executions: list[Execution]) -> None:
+    for execution in executions:
+        execution.timestamp = clock.next()
+
+
+def order_rows(user_id: UUID4, ticker: str, executions: list[Execution]) -> list[tuple]:
+    return [
+        (
+            execution.id, user_id, ticker, execution.order.direction, execution.status,
+            execution.order.qty, execution.filled, execution.price, execution.timestamp
+        )
+        for execution in executions
+    ]
+
+
+@dataclass(slots=True)
+class Settlement:
+    trades: list[tuple] = field(default_factory=list)
+    deltas: dict[tuple[UUID4, str], list[int]] = field(default_factory=dict)
+    matched: dict[uuid.UUID, tuple[OrderStatus, int]] = field(default_factory=dict)
+
+    def merge(self, other: 'Settlement') -> None:
+        self.trades.extend(other.trades)
+
+        for key, delta in other.deltas.items():
+            current = self.deltas.setdefault(key, [0, 0])
+            current[0] += delta[0]
+            current[1] += delta[1]
+
+        self.matched.update(other.matched)
+
+
+def prepare(ticker: str, user_id: UUID4, executions: list[Execution]) -> Settlement:
+    trades = []
+    deltas: dict[tuple[UUID4, str], list[int]] = defaultdict(lambda: [0, 0])
+    matched: dict[uuid.UUID, list] = {}
+
+    for execution in executions:
+        direction = execution.order.direction
+
+        for fill in execution.fills:
+            if direction == Direction.BUY:
+                buyer_user_id, buyer_order_id = user_id, execution.id
+                seller_user_id, seller_order_id = fill.order.user_id, fill.order.id
+            else:
+                buyer_user_id, buyer_order_id = fill.order.user_id, fill.order.id
+                seller_user_id, seller_order_id = user_id, execution.id
+
+            trades.append((
+                fill.qty, fill.price, buyer_user_id, seller_user_id, buyer_order_id, seller_order_id,
+                execution.timestamp
+            ))
+
+            deltas[(buyer_user_id, 'RUB')][0] -= fill.qty * fill.price
+            deltas[(buyer_user_id, ticker)][0] += fill.qty
+            deltas[(seller_user_id, ticker)][0] -= fill.qty
+            deltas[(seller_user_id, 'RUB')][0] += fill.qty * fill.price
+
+            asset, amount = reserved_asset(ticker, fill.order.direction, fill.order.price, fill.qty)
+            deltas[(fill.order.user_id, asset)][1] -= amount
+
+            if fill.order.id in matched:
+                matched[fill.order.id][1] += fill.qty
+            else:
+                matched[fill.order.id] = [fill.order, fill.qty]
+
+        if execution.resting is not None:
+            asset, amount = reserved_asset(ticker, direction, execution.resting.price, execution.resting.remaining)
+            deltas[(user_id, asset)][1] += amount
+
+    return Settlement(
+        trades=trades,
+        deltas={key: delta for key, delta in deltas.items() if delta != [0, 0]},
+        matched={
+            order.id: (
+                OrderStatus.EXECUTED if order.filled + qty == order.qty else OrderStatus.PARTIALLY_EXECUTED,
+                order.filled + qty
+            )
+            for order, qty in matched.values()
+        }
+    )
+
+
+async def settle(connection: Connection, ticker: str, settlement: Settlement) -> None:
+    trades, deltas, matched = settlement.trades, settlement.deltas, settlement.matched
+
+    if trades:
+        await bulk_insert(
+            connection,
+            'transactions',
+            TRANSACTION_COLUMNS,
+            [(ticker, *trade) for trade in trades],
+            INSERT_TRANSACTIONS,
+            settings.database.copy_threshold
+        )
+        await write_candles(connection, ticker, aggregate([(trade[6], trade[1], trade[0]) for trade in trades]))
+
+    deltas = {key: deltas[key] for key in sorted(deltas) if deltas[key] != [0, 0]}
+
+    if deltas:
+        await connection.execute(
+            UPDATE_BALANCES,
+            [key[0] for key in deltas],
+            [key[1] for key in deltas],
+            [delta[0] for delta in deltas.values()],
+            [delta[1] for delta in deltas.values()]
+        )
+
+    if matched:
+        await connection.execute(
+            UPDATE_ORDERS,
+            list(matched),
+            [status for status, _ in matched.values()],
+            [filled for _, filled in matched.values()]
+        )
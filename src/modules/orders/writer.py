@@ -0,0 +1,251 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable
+
+from asyncpg import Connection, InterfaceError, PostgresConnectionError, PostgresError
+from loguru import logger
+
+from core.config.settings import settings
+from core.methods.pool import bulk_insert
+from core.objects.database import database
+from core.objects.ledger import ledger
+from core.schemes.order import Durability
+from modules.orders.settlement import INSERT_ORDER_ROWS, ORDER_COLUMNS, Settlement, settle
+
+UPDATE_ENGINE_STATES = """
+    INSERT INTO engine_state (ticker, seq)
+    SELECT * FROM unnest($1::text[], $2::bigint[])
+    ON CONFLICT (ticker) DO UPDATE SET seq = greatest(engine_state.seq, excluded.seq)
+"""
+
+
+@dataclass(slots=True)
+class Write:
+    ticker: str
+    orders: list[tuple]
+    settlement: Settlement
+    seq: int | None
+    future: asyncio.Future
+
+
+class Writer:
+    RESULTS_SIZE = 100_000
+
+    def __init__(self, *, is_enabled: bool, flush_interval: float, flush_size: int, max_pending: int):
+        self.__is_enabled = is_enabled
+        self.__flush_interval = flush_interval
+        self.__flush_size = flush_size
+        self.__max_pending = max_pending
+
+        self.__writes: list[Write] = []
+        self.__last: asyncio.Future | None = None
+        self.__pending = 0
+
+        self.__orders: dict[uuid.UUID, tuple[uuid.UUID, Write]] = {}
+        self.__results: dict[uuid.UUID, tuple[uuid.UUID, bool]] = {}
+
+        self.__halted: set[str] = set()
+        self.__callbacks: list[Callable[[str], None]] = []
+
+        self.__has_writes = asyncio.Event()
+        self.__has_capacity = asyncio.Event()
+        self.__has_capacity.set()
+
+        self.__is_running = False
+        self.__task: asyncio.Task | None = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.__is_enabled
+
+    @property
+    def pending(self) -> int:
+        return self.__pending
+
+    def start(self) -> None:
+        self.__is_running = True
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.__task is None:
+            return
+
+        self.__is_running = False
+        self.__has_writes.set()
+
+        await self.__task
+        self.__task = None
+
+    def is_halted(self, ticker: str) -> bool:
+        return ticker in self.__halted
+
+    def resume(self, ticker: str) -> None:
+        self.__halted.discard(ticker)
+
+    def listen(self, callback: Callable[[str], None]) -> None:
+        self.__callbacks.append(callback)
+
+    async def reserve(self) -> None:
+        while self.__pending >= self.__max_pending:
+            await self.__has_capacity.wait()
+
+    def submit(
+        self,
+        ticker: str,
+        user_id: uuid.UUID,
+        orders: list[tuple],
+        settlement: Settlement,
+        seq: int | None
+    ) -> None:
+        write = Write(
+            ticker=ticker,
+            orders=orders,
+            settlement=settlement,
+            seq=seq,
+            future=asyncio.get_running_loop().create_future()
+        )
+
+        self.__writes.append(write)
+        self.__last = write.future
+        self.__pending += len(orders)
+
+        for order in orders:
+            self.__orders[order[0]] = (user_id, write)
+
+        if self.__pending >= self.__max_pending:
+            self.__has_capacity.clear()
+
+        self.__has_writes.set()
+
+    def status(self, order_id: uuid.UUID, user_id: uuid.UUID) -> Durability | None:
+        if (pending := self.__orders.get(order_id)) is not None and pending[0] == user_id:
+            return Durability.PENDING
+
+        if (result := self.__results.get(order_id)) is not None and result[0] == user_id:
+            return Durability.DURABLE if result[1] else Durability.FAILED
+
+        return None
+
+    async def wait(self, *order_ids: uuid.UUID) -> bool:
+        futures = [
+            pending[1].future for order_id in order_ids if (pending := self.__orders.get(order_id)) is not None
+        ]
+
+        if futures:
+            await asyncio.wait(futures)
+
+        return all(self.__results.get(order_id, (None, True))[1] for order_id in order_ids)
+
+    async def barrier(self) -> None:
+        if self.__last is not None and not self.__last.done():
+            await asyncio.shield(self.__last)
+
+    @staticmethod
+    async def __write(connection: Connection, batch: list[Write]) -> None:
+        orders = [order for write in batch for order in write.orders]
+
+        if orders:
+            await bulk_insert(
+                connection, 'orders', ORDER_COLUMNS, orders, INSERT_ORDER_ROWS, settings.database.copy_threshold
+            )
+
+        settlements: dict[str, Settlement] = {}
+
+        for write in batch:
+            settlements.setdefault(write.ticker, Settlement()).merge(write.settlement)
+
+        for ticker, settlement in settlements.items():
+            await settle(connection, ticker, settlement)
+
+        states = {write.ticker: write.seq for write in batch if write.seq is not None}
+
+        if states:
+            await connection.execute(UPDATE_ENGINE_STATES, list(states), list(states.values()))
+
+    async def __flush(self, batch: list[Write]) -> list[Write]:
+        async with database.get_connection() as connection:
+            try:
+                async with connection.transaction():
+                    await self.__write(connection, batch)
+
+                return []
+            except (PostgresConnectionError, InterfaceError):
+                raise
+            except PostgresError as error:
+                logger.warning(f'Групповая запись не удалась, запись по одной операции: {error}')
+
+            failed = []
+
+            for write in batch:
+                try:
+                    async with connection.transaction():
+                        await self.__write(connection, [write])
+                except (PostgresConnectionError, InterfaceError):
+                    raise
+                except PostgresError:
+                    logger.exception(f'Не удалось сохранить ордера {[order[0] for order in write.orders]}')
+                    failed.append(write)
+
+            return failed
+
+    def __complete(self, batch: list[Write], failed: list[Write]) -> None:
+        failed_ids = {id(write) for write in failed}
+
+        for write in batch:
+            is_durable = id(write) not in failed_ids
+
+            for order in write.orders:
+                user_id, _ = self.__orders.pop(order[0])
+                self.__results[order[0]] = (user_id, is_durable)
+
+            if not write.future.done():
+                write.future.set_result(is_durable)
+
+            self.__pending -= len(write.orders)
+
+        for write in failed:
+            ledger.revert(write.settlement.deltas)
+
+            if write.ticker in self.__halted:
+                continue
+
+            self.__halted.add(write.ticker)
+            logger.error(f'Стакан {write.ticker} остановлен до перезагрузки из базы')
+
+            for callback in self.__callbacks:
+                callback(write.ticker)
+
+        while len(self.__results) > self.RESULTS_SIZE:
+            del self.__results[next(iter(self.__results))]
+
+        if self.__pending < self.__max_pending:
+            self.__has_capacity.set()
+
+    async def __run(self) -> None:
+        while self.__is_running or self.__writes:
+            if not self.__writes:
+                self.__has_writes.clear()
+                await self.__has_writes.wait()
+                continue
+
+            if len(self.__writes) < self.__flush_size and self.__is_running:
+                await asyncio.sleep(self.__flush_interval)
+
+            batch = self.__writes[:self.__flush_size]
+            del self.__writes[:self.__flush_size]
+
+            start_time = time.perf_counter()
+
+            while True:
+                try:
+                    failed = await self.__flush(batch)
+                    break
+                except (OSError, asyncio.TimeoutError, PostgresConnectionError, InterfaceError) as error:
+                    logger.warning(f'База недоступна, повтор записи {len(batch)} операций: {error}')
+                    await asyncio.sleep(1)
+
+            self.__complete(batch, failed)
+
+            logger.debug(f'Записано операций: {len(batch)} за {time.perf_counter() - start_time:.4f} с')
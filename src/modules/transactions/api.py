@@ -1,39 +1,30 @@
 from typing import Annotated
 
-from everbase import Select
 from fastapi import APIRouter, Query, HTTPException, Path
-from fastapi.responses import ORJSONResponse
-from sqlalchemy import true
+from fastapi.responses import Response
 
-from core.models.instrument import Instrument
-from core.models.transaction import Transaction
-from core.objects.database import database
-from modules.transactions.schemes import TransactionsModel
+from core.objects.database import read_database
+from core.objects.instruments import instruments
+from core.objects.statements import statements
+from modules.transactions.schemes import TRANSACTION_SERIALIZER
 
 router = APIRouter()
 
+SELECT_TRANSACTIONS = statements.register(
+    'select_transactions',
+    "SELECT ticker, amount, price, timestamp FROM transactions WHERE ticker = $1 ORDER BY timestamp DESC LIMIT $2"
+)
+
 
 @router.get("/public/transactions/{ticker}")
 async def get_public_transaction(
     ticker: Annotated[str, Path(pattern='^[A-Z]{2,10}$')],
     limit: Annotated[int, Query()] = 10
 ):
-    is_instrument_exist = await (
-        Select(true())
-        .select_from(Instrument)
-        .where(Instrument.ticker == ticker)
-        .fetch_one(database)
-    )
-
-    if is_instrument_exist is None:
+    if ticker not in instruments:
         raise HTTPException(status_code=404, detail="Инструмент не найден")
 
-    transactions = await (
-        Select(Transaction)
-        .where(Transaction.ticker == ticker)
-        .order_by(Transaction.timestamp.desc())
-        .limit(limit)
-        .fetch_all(database, model=lambda x: TransactionsModel(**x).model_dump())
-    )
+    async with read_database.get_connection() as connection:
+        transactions = await connection.fetch_statement(SELECT_TRANSACTIONS, ticker, limit)
 
-    return ORJSONResponse(content=transactions)
+    return Response(content=TRANSACTION_SERIALIZER.dumps_many(transactions), media_type='application/json')
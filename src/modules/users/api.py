@@ -1,45 +1,55 @@
 import uuid
 from typing import Annotated
 
-from asyncpg import Record
+import orjson
 from everbase import Insert, Select, Delete, Update
 from fastapi import APIRouter, Body, Depends, Path, HTTPException
 from fastapi.responses import ORJSONResponse
 from pydantic import UUID4
-from sqlalchemy import true, func
+from sqlalchemy import true
 
 from core.methods.authentication import Authentication
 from core.models.balance import Balance
-from core.models.instrument import Instrument
-from core.models.order import Order
 from core.models.user import User
 from core.objects.database import database
-from core.schemes.order import Direction, OrderStatus
+from core.objects.instruments import instruments
+from core.objects.journal import journal
+from core.objects.ledger import ledger
+from core.objects.shard import shard
+from core.objects.statements import statements
+from core.objects.writer import writer
 from core.schemes.user import UserRole
+from modules.orders.dispatch import submit_drop_user
 from modules.users.schemes import UserModel
 
 router = APIRouter()
 
+NOTIFY_USERS = "SELECT pg_notify('users', $1)"
+
+ADVANCE_ENGINE_STATES = "UPDATE engine_state SET seq = seq + 1"
+
+SELECT_BALANCES = statements.register('select_balances', "SELECT ticker, amount FROM balances WHERE user_id = $1")
+
 
 @router.post('/public/register')
 async def create_user(name: Annotated[str, Body(embed=True, min_length=3)]):
-    response = await (
-        Insert(User)
-        .values(name=name, api_key=f'{uuid.uuid4()}')
-        .returning(User.id, User.name, User.role, User.api_key)
-        .fetch_one(database, model=UserModel)
-    )
+    async with database.get_connection() as connection:
+        response = await (
+            Insert(User)
+            .values(name=name, api_key=f'{uuid.uuid4()}')
+            .returning(User.id, User.name, User.role, User.api_key)
+            .fetch_one(connection, model=UserModel)
+        )
+
+    Authentication.invalidate(response.api_key)
 
     return ORJSONResponse(content=response.model_dump())
 
 
 @router.get('/balance')
 async def get_user_balance(user: Annotated[UserModel, Depends(Authentication(user_role=UserRole.USER))]):
-    user_balances = await (
-        Select(Balance.ticker, Balance.amount)
-        .where(Balance.user_id == user.id)
-        .fetch_all(database)
-    )
+    async with database.get_connection() as connection:
+        user_balances = await connection.fetch_statement(SELECT_BALANCES, user.id)
 
     return ORJSONResponse(content={balance['ticker']: balance['amount'] for balance in user_balances})
 
@@ -49,16 +59,30 @@ async def delete_user(
     user_id: Annotated[UUID4, Path()],
     _: Annotated[UserModel, Depends(Authentication(user_role=UserRole.ADMIN))]
 ):
-    response = await (
-        Delete(User)
-        .where(User.id == user_id)
-        .returning(User.id, User.name, User.role, User.api_key)
-        .fetch_one(database, model=UserModel)
-    )
+    async with database.get_connection() as connection, connection.transaction():
+        response = await (
+            Delete(User)
+            .where(User.id == user_id)
+            .returning(User.id, User.name, User.role, User.api_key)
+            .fetch_one(connection, model=UserModel)
+        )
+
+        if response and journal.is_enabled:
+            await connection.execute(ADVANCE_ENGINE_STATES)
+
+        if response and shard.is_enabled:
+            await connection.execute(
+                NOTIFY_USERS, orjson.dumps({'id': response.id, 'api_key': response.api_key}).decode()
+            )
 
     if not response:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
+    Authentication.invalidate(response.api_key)
+
+    if not shard.is_enabled:
+        await submit_drop_user(response.id)
+
     return ORJSONResponse(content=response.model_dump())
 
 
@@ -69,37 +93,34 @@ async def deposit(
     amount: Annotated[int, Body(gt=0)],
     _: Annotated[UserModel, Depends(Authentication(user_role=UserRole.ADMIN))]
 ):
-    is_user_exist = await (
-        Select(true())
-        .select_from(User)
-        .where(User.id == user_id)
-        .fetch_one(database)
-    )
-
-    if is_user_exist is None:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    async with database.get_connection() as connection:
+        is_user_exist = await (
+            Select(true())
+            .select_from(User)
+            .where(User.id == user_id)
+            .fetch_one(connection)
+        )
 
-    is_instrument_exist = await (
-        Select(true())
-        .select_from(Instrument)
-        .where(Instrument.ticker == ticker)
-        .fetch_one(database)
-    )
-
-    if is_instrument_exist is None:
-        raise HTTPException(status_code=404, detail="Инструмент не найден")
-
-    await (
-        (query := (
-            Insert(Balance)
-            .values(user_id=user_id, ticker=ticker, amount=amount)
-        ))
-        .on_conflict_do_update(
-            index_elements=(Balance.user_id, Balance.ticker),
-            set_={'amount': Balance.amount + query.excluded.amount}
+        if is_user_exist is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+        if ticker not in instruments:
+            raise HTTPException(status_code=404, detail="Инструмент не найден")
+
+        await (
+            (query := (
+                Insert(Balance)
+                .values(user_id=user_id, ticker=ticker, amount=amount)
+            ))
+            .on_conflict_do_update(
+                index_elements=(Balance.user_id, Balance.ticker),
+                set_={'amount': Balance.amount + query.excluded.amount}
+            )
+            .execute(connection)
         )
-        .execute(database)
-    )
+
+    if writer.is_enabled:
+        ledger.apply({(user_id, ticker): [amount, 0]})
 
     return ORJSONResponse(content={"success": True})
 
@@ -111,56 +132,40 @@ async def withdraw(
     amount: Annotated[int, Body(gt=0)],
     _: Annotated[UserModel, Depends(Authentication(user_role=UserRole.ADMIN))]
 ):
-    is_user_exist = await (
-        Select(true())
-        .select_from(User)
-        .where(User.id == user_id)
-        .fetch_one(database)
-    )
-
-    if is_user_exist is None:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-    is_instrument_exist = await (
-        Select(true())
-        .select_from(Instrument)
-        .where(Instrument.ticker == ticker)
-        .fetch_one(database)
-    )
-
-    if is_instrument_exist is None:
-        raise HTTPException(status_code=404, detail="Инструмент не найден")
-
-    balance = await (
-        Select(Balance.amount)
-        .where(Balance.user_id == user_id, Balance.ticker == ticker)
-        .fetch_one(database)
-    )
-
-    if balance is None:
-        raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-    order_balance: Record = await (
-        Select(func.sum(Order.qty - Order.filled).label('amount'))
-        .where(
-            Order.direction == Direction.SELL,
-            Order.user_id == user_id,
-            Order.ticker == ticker,
-            Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED])
-        )
-        .fetch_one(database)
-    )
-
-    available = balance['amount'] - (order_balance['amount'] or 0)
-
-    if available < amount:
-        raise HTTPException(status_code=409, detail="Недостаточно средств")
-
-    await (
-        Update(Balance)
-        .values(amount=Balance.amount - amount)
-        .where(Balance.user_id == user_id, Balance.ticker == ticker)
-        .execute(database)
-    )
+    with ledger.transaction():
+        if writer.is_enabled:
+            if ledger.available(user_id, [ticker]).get(ticker, 0) < amount:
+                raise HTTPException(status_code=409, detail="Недостаточно средств")
+
+            ledger.apply({(user_id, ticker): [-amount, 0]})
+
+        async with database.get_connection() as connection:
+            is_user_exist = await (
+                Select(true())
+                .select_from(User)
+                .where(User.id == user_id)
+                .fetch_one(connection)
+            )
+
+            if is_user_exist is None:
+                raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+            if ticker not in instruments:
+                raise HTTPException(status_code=404, detail="Инструмент не найден")
+
+            response = await (
+                Update(Balance)
+                .values(amount=Balance.amount - amount)
+                .where(
+                    Balance.user_id == user_id,
+                    Balance.ticker == ticker,
+                    Balance.amount - Balance.reserved >= amount
+                )
+                .returning(true())
+                .fetch_one(connection)
+            )
+
+        if response is None:
+            raise HTTPException(status_code=409, detail="Недостаточно средств")
 
     return ORJSONResponse(content={"success": True})
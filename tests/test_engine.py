@@ -0,0 +1,153 @@
+import uuid
+
+from fastapi import HTTPException
+
+from core.schemes.order import Direction, OrderStatus
+from modules.orders.book import Book, BookOrder
+from modules.orders.engine import Execution, plan, apply
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody
+
+TICKER = 'TEST'
+BALANCE = 10 ** 12
+
+MAKER_ID = uuid.UUID(int=1)
+TAKER_ID = uuid.UUID(int=2)
+
+
+def make_book(*orders: tuple[Direction, int, int]) -> tuple[Book, list[BookOrder]]:
+    book = Book(TICKER)
+    resting = []
+
+    for number, (direction, price, qty) in enumerate(orders, start=1):
+        order = BookOrder(id=uuid.UUID(int=number << 64), user_id=MAKER_ID, direction=direction, price=price, qty=qty)
+
+        book.add(order)
+        resting.append(order)
+
+    return book, resting
+
+
+def balances(rub: int = BALANCE, shares: int = BALANCE) -> dict[str, int]:
+    return {'RUB': rub, TICKER: shares}
+
+
+def fills(execution: Execution) -> list[tuple[int, int]]:
+    return [(fill.price, fill.qty) for fill in execution.fills]
+
+
+def test_plan_does_not_touch_book():
+    book, resting = make_book((Direction.SELL, 101, 5), (Direction.SELL, 102, 5))
+    levels = book.levels(10)
+
+    [execution] = plan(
+        book, TAKER_ID, TICKER, [LimitOrderBody(ticker=TICKER, direction=Direction.BUY, qty=7, price=102)], balances()
+    )
+
+    assert fills(execution) == [(101, 5), (102, 2)]
+    assert execution.status == OrderStatus.EXECUTED
+    assert execution.filled == 7
+    assert execution.resting is None
+
+    assert book.levels(10) == levels
+    assert [order.filled for order in resting] == [0, 0]
+
+
+def test_apply_fills_and_rests_remainder():
+    book, (maker,) = make_book((Direction.SELL, 100, 5))
+
+    [execution] = plan(
+        book, TAKER_ID, TICKER, [LimitOrderBody(ticker=TICKER, direction=Direction.BUY, qty=8, price=101)], balances()
+    )
+
+    assert fills(execution) == [(100, 5)]
+    assert execution.status == OrderStatus.PARTIALLY_EXECUTED
+
+    apply(book, [execution])
+
+    assert maker.id not in book
+    assert execution.id in book
+    assert book.levels(10) == {'bid_levels': [{'price': 101, 'qty': 3}], 'ask_levels': []}
+
+
+def test_fills_follow_price_time_priority():
+    book, (first, second, worse) = make_book(
+        (Direction.BUY, 100, 5), (Direction.BUY, 100, 5), (Direction.BUY, 99, 5)
+    )
+
+    [execution] = plan(
+        book, TAKER_ID, TICKER, [MarketOrderBody(ticker=TICKER, direction=Direction.SELL, qty=7)], balances()
+    )
+
+    assert [fill.order.id for fill in execution.fills] == [first.id, second.id]
+    assert fills(execution) == [(100, 5), (100, 2)]
+
+    apply(book, [execution])
+
+    assert first.id not in book
+    assert book.get(second.id).remaining == 3
+    assert book.get(worse.id).remaining == 5
+
+
+def test_batch_does_not_refill_consumed_orders():
+    book, (maker,) = make_book((Direction.SELL, 100, 6))
+    orders = [LimitOrderBody(ticker=TICKER, direction=Direction.BUY, qty=5, price=100) for _ in range(2)]
+
+    first, second = plan(book, TAKER_ID, TICKER, orders, balances())
+
+    assert fills(first) == [(100, 5)]
+    assert fills(second) == [(100, 1)]
+    assert second.resting.remaining == 4
+    assert maker.filled == 0
+
+    apply(book, [first, second])
+
+    assert maker.id not in book
+    assert book.levels(10) == {'bid_levels': [{'price': 100, 'qty': 4}], 'ask_levels': []}
+
+
+def test_unfilled_market_order_is_cancelled():
+    book, (maker,) = make_book((Direction.SELL, 100, 5))
+
+    [execution] = plan(
+        book, TAKER_ID, TICKER, [MarketOrderBody(ticker=TICKER, direction=Direction.BUY, qty=10)], balances()
+    )
+
+    assert execution.status == OrderStatus.CANCELLED
+    assert execution.fills == []
+    assert execution.filled == 0
+
+    apply(book, [execution])
+
+    assert book.get(maker.id).remaining == 5
+
+
+def test_market_buy_is_limited_by_budget():
+    book, _ = make_book((Direction.SELL, 100, 2), (Direction.SELL, 200, 2))
+    available = balances(rub=400)
+
+    [execution] = plan(
+        book, TAKER_ID, TICKER, [MarketOrderBody(ticker=TICKER, direction=Direction.BUY, qty=3)], available
+    )
+
+    assert fills(execution) == [(100, 2), (200, 1)]
+    assert execution.spent == 400
+    assert available['RUB'] == 0
+
+
+def test_insufficient_funds_are_rejected_without_fills():
+    book, (maker,) = make_book((Direction.SELL, 100, 5))
+    orders = [
+        LimitOrderBody(ticker=TICKER, direction=Direction.BUY, qty=5, price=100),
+        LimitOrderBody(ticker=TICKER, direction=Direction.BUY, qty=1, price=100)
+    ]
+
+    execution, rejected = plan(book, TAKER_ID, TICKER, orders, balances(rub=500))
+
+    assert fills(execution) == [(100, 5)]
+    assert isinstance(rejected, HTTPException)
+    assert rejected.status_code == 409
+
+    apply(book, [execution, rejected])
+
+    assert maker.id not in book
+    assert book.levels(10) == {'bid_levels': [], 'ask_levels': []}
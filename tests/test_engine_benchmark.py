@@ -0,0 +1,148 @@
+import random
+import uuid
+
+import pytest
+
+from core.schemes.order import Direction, OrderStatus
+from modules.orders.book import Book, BookOrder
+from modules.orders.engine import Execution, plan, apply
+from modules.orders.schemes import LimitOrderBody, MarketOrderBody
+
+TICKER = 'BENCH'
+MID_PRICE = 1_000_000
+LEVEL_QTY = 10
+BALANCE = 2 ** 62
+
+ORDERS_PER_LEVEL = 10
+ROUNDS = 1000
+SEED = 0
+
+DEPTHS = (10, 1000, 100_000)
+
+MAKER_ID = uuid.UUID(int=1)
+TAKER_ID = uuid.UUID(int=2)
+
+
+class Scenario:
+
+    def __init__(self, depth: int, orders_per_level: int, seed: int):
+        self.random = random.Random(seed)
+        self.book = Book(TICKER)
+        self.depth = depth
+        self.orders_per_level = orders_per_level
+
+        self.__next_id = 0
+        self.resting: list[BookOrder] = []
+        self.results: list[Execution] = []
+
+        for index in range(depth):
+            level, side = divmod(index, 2)
+            offset = level // orders_per_level + 1
+
+            if side == 0:
+                self.add(Direction.BUY, MID_PRICE - offset)
+            else:
+                self.add(Direction.SELL, MID_PRICE + offset)
+
+    def add(self, direction: Direction, price: int, qty: int = LEVEL_QTY) -> None:
+        self.__next_id += 1
+
+        order = BookOrder(
+            id=uuid.UUID(int=self.__next_id << 64), user_id=MAKER_ID, direction=direction, price=price, qty=qty
+        )
+
+        self.book.add(order)
+        self.resting.append(order)
+
+    def submit(self, order: LimitOrderBody | MarketOrderBody) -> None:
+        self.results = plan(self.book, TAKER_ID, TICKER, [order], {'RUB': BALANCE, TICKER: BALANCE})
+        apply(self.book, self.results)
+
+    def refill(self) -> None:
+        for execution in self.results:
+            check(execution)
+
+            for fill in execution.fills:
+                self.add(fill.order.direction, fill.order.price, fill.qty)
+
+        self.results = []
+
+    def limit(self) -> LimitOrderBody:
+        direction = self.random.choice((Direction.BUY, Direction.SELL))
+        price = MID_PRICE + self.random.randint(-self.orders_per_level, self.orders_per_level)
+
+        return LimitOrderBody(ticker=TICKER, direction=direction, qty=self.random.randint(1, LEVEL_QTY), price=price)
+
+    def sweep(self) -> MarketOrderBody:
+        direction = self.random.choice((Direction.BUY, Direction.SELL))
+        levels = self.random.randint(1, 5)
+        qty = min(levels * self.orders_per_level, max(self.depth // 2, 1)) * LEVEL_QTY
+
+        return MarketOrderBody(ticker=TICKER, direction=direction, qty=qty)
+
+    def pick(self) -> BookOrder:
+        index = self.random.randrange(len(self.resting))
+        self.resting[index], self.resting[-1] = self.resting[-1], self.resting[index]
+
+        return self.resting.pop()
+
+
+def check(execution: Execution) -> None:
+    prices = [fill.price for fill in execution.fills]
+
+    assert execution.filled == sum(fill.qty for fill in execution.fills)
+    assert prices == sorted(prices, reverse=execution.order.direction == Direction.SELL)
+
+    if execution.price is not None and execution.order.direction == Direction.BUY:
+        assert all(price <= execution.price for price in prices)
+    elif execution.price is not None:
+        assert all(price >= execution.price for price in prices)
+
+    if isinstance(execution.order, MarketOrderBody):
+        assert execution.status in (OrderStatus.EXECUTED, OrderStatus.CANCELLED)
+
+
+@pytest.mark.parametrize('depth', DEPTHS)
+def test_limit(benchmark, depth: int):
+    scenario = Scenario(depth, ORDERS_PER_LEVEL, SEED)
+
+    def setup():
+        scenario.refill()
+        return (scenario.limit(),), {}
+
+    benchmark.pedantic(scenario.submit, setup=setup, rounds=ROUNDS)
+    scenario.refill()
+
+
+@pytest.mark.parametrize('depth', DEPTHS)
+def test_sweep(benchmark, depth: int):
+    scenario = Scenario(depth, ORDERS_PER_LEVEL, SEED)
+
+    def setup():
+        scenario.refill()
+        return (scenario.sweep(),), {}
+
+    benchmark.pedantic(scenario.submit, setup=setup, rounds=ROUNDS)
+
+    assert all(execution.status == OrderStatus.EXECUTED for execution in scenario.results)
+    scenario.refill()
+
+
+@pytest.mark.parametrize('depth', DEPTHS)
+def test_cancel(benchmark, depth: int):
+    scenario = Scenario(depth, ORDERS_PER_LEVEL, SEED)
+    cancelled: list[BookOrder] = []
+
+    def setup():
+        for order in cancelled:
+            assert order.id not in scenario.book
+            scenario.add(order.direction, order.price, order.qty)
+
+        cancelled.clear()
+        cancelled.append(order := scenario.pick())
+
+        return (order.id,), {}
+
+    benchmark.pedantic(scenario.book.remove, setup=setup, rounds=ROUNDS)
+
+    assert cancelled[0].id not in scenario.book